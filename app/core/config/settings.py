@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "YOUR_SECRET_KEY_HERE")  # Should be changed in production!
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # Verified tokens kept in memory, 0 disables the cache
+    AUTH_CACHE_TTL: int = 30  # Seconds a cached token is trusted, at most 60 and its expiry; with several workers, how long a deactivation takes to reach the others
+    PASSWORD_HASH_WORKERS: int = 2  # Concurrent bcrypt operations; further logins queue
     
     # Database settings
     DATABASE_USER: str = os.getenv("DATABASE_USER")
@@ -20,14 +23,80 @@ class Settings(BaseSettings):
     DATABASE_HOST: str = os.getenv("DATABASE_HOST")
     DATABASE_PORT: str = os.getenv("DATABASE_PORT", "5432")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME")
-    DATABASE_URL: str = f"postgresql+asyncpg://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+    DATABASE_URL: str = os.getenv("DATABASE_URL") or f"postgresql+asyncpg://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+    DATABASE_ECHO: bool = os.getenv("DATABASE_ECHO", "true").lower() == "true"  # Log every SQL statement
     
     # Discord settings
     DISCORD_TOKEN: str = os.getenv("DISCORD_TOKEN")
     CHANNEL_ID: int = int(os.getenv("CHANNEL_ID", "0"))
+    STORAGE_SHARDS: str = os.getenv("STORAGE_SHARDS", "")  # "token:channel_id", "local:<dir>" or "s3:<bucket>[/<prefix>]" entries; empty uses the two above
+    SHARD_PLACEMENT: str = os.getenv("SHARD_PLACEMENT", "round_robin")  # round_robin, least_loaded or hash
+    UPLOAD_SHARDS: str = os.getenv("UPLOAD_SHARDS", "")  # Comma separated shards taking new uploads; empty for all
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "")  # e.g. a local MinIO; empty for AWS
+    S3_REGION: str = os.getenv("S3_REGION", "")
+    ATTACHMENT_URL_REFRESH_MARGIN: int = 600  # Refresh CDN URLs expiring within this many seconds
+    DISCORD_MAX_ATTACHMENTS: int = 10  # Attachments allowed per message
+    DISCORD_MAX_MESSAGE_BYTES: int = 25 * 1024 * 1024  # Upload size limit per message
+    DISCORD_MAX_CONCURRENCY: int = 8  # Requests in flight per shard, across all lanes
+    DISCORD_GLOBAL_RATE_LIMIT: int = 50  # API requests per second per bot token
+    DISCORD_RATE_LIMIT_RETRIES: int = 3
     
     # File settings
     CHUNK_SIZE: int = 24 * 1024 * 1024  # 24MB
+    UPLOAD_CONCURRENCY: int = 4  # Chunks in flight per upload (memory ~ window x CHUNK_SIZE)
+    UPLOAD_BUFFER_POOL_SIZE: int = 8  # CHUNK_SIZE buffers shared by all streaming uploads
+    UPLOAD_BUFFERS_PER_REQUEST: int = 2  # Pool buffers one upload may hold, so slow clients cannot take them all
+    UPLOAD_BUFFER_TIMEOUT: float = 30  # Seconds to wait for a free buffer before answering 503
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # Seconds a resumable upload stays open
+    UPLOAD_SESSION_REAP_INTERVAL: int = 3600
+    DOWNLOAD_PREFETCH: int = 4  # Chunks fetched ahead of the one being streamed
+    DOWNLOAD_PREFETCH_MAX_BYTES: int = 96 * 1024 * 1024  # Per-request cap on buffered chunks
+    
+    # Client caching settings
+    FILE_CACHE_MAX_AGE: int = 365 * 24 * 3600  # /view/{id}: file ids are never reused, so content is immutable
+    FILE_NAME_CACHE_MAX_AGE: int = 300  # /download and /open: a name can point at new content after a delete
+    FILE_CACHE_SCOPE: str = "private"  # "public" lets shared caches serve files without checking auth
+    
+    # Folder archive settings
+    ARCHIVE_PAGE_SIZE: int = 200  # Files whose chunks are loaded and prefetched together
+    ARCHIVE_COMPRESSION_LEVEL: int = 6  # zlib level used by compression=deflate
+    
+    # Listing settings
+    DEFAULT_PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 1000
+    
+    # Delete outbox settings
+    DELETE_WORKER_INTERVAL: int = 5  # Seconds between outbox polls when idle
+    DELETE_BATCH_SIZE: int = 500  # Outbox rows claimed per pass
+    DELETE_RETRY_BASE: int = 30  # Seconds before the first retry, doubled per failure
+    DELETE_RETRY_MAX: int = 3600
+    DELETE_CLAIM_TIMEOUT: int = 300  # Seconds claimed rows stay hidden from other workers while being deleted
+    
+    # Small-file packing settings
+    PACK_THRESHOLD: int = 256 * 1024  # Files up to this size are appended into shared packs
+    PACK_MAX_BYTES: int = 8 * 1024 * 1024
+    PACK_COMPACTION_INTERVAL: int = 3600  # Seconds between compaction runs
+    PACK_COMPACTION_LIVE_RATIO: float = 0.5  # Rewrite packs with less live data than this
+    
+    # Compression settings
+    COMPRESSION_ENABLED: bool = False
+    COMPRESSION_CODECS: str = "zlib,lzma"  # Candidates tried on a sample of each chunk
+    COMPRESSION_SAMPLE_BYTES: int = 64 * 1024
+    COMPRESSION_MAX_RATIO: float = 0.9  # Store raw unless compressed size is below this fraction
+    
+    # Write-back settings
+    WRITE_BACK_ENABLED: bool = False  # Acknowledge uploads once staged on local disk, flush to storage in the background
+    STAGING_DIR: str = "app/cache/staging"  # Must survive restarts; pending chunks are only here
+    WRITE_BACK_INTERVAL: int = 2  # Seconds between flusher polls when idle
+    WRITE_BACK_BATCH_SIZE: int = 50  # Staged objects flushed per pass
+    WRITE_BACK_RETRY_BASE: int = 10  # Seconds before the first retry, doubled per failure
+    WRITE_BACK_RETRY_MAX: int = 600
+    STAGING_ORPHAN_AGE: int = 3600  # Unreferenced, unleased staged objects older than this are removed at startup
+    STAGING_LEASE_TTL: int = 600  # Seconds a staged object stays leased after the uploading worker last renewed it
+    
+    # Chunk cache settings
+    CHUNK_CACHE_DIR: str = "app/cache/chunks"
+    CHUNK_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 1GB, 0 disables the cache
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,209 @@
+import bisect
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from fast DB checkouts to whole-file transfers
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Samples = Iterable[Tuple[Tuple[str, ...], float]]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric(ABC):
+    """Base of the in-process metrics; values are plain dicts keyed by label values.
+
+    Everything runs on the event loop thread, so recording a sample is a
+    dict lookup and an addition, with no locking.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    @abstractmethod
+    def collect(self) -> List[str]:
+        """The metric's sample lines in the text exposition format."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.collect()]
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from ``function`` at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.function: Optional[Callable[[], Samples]] = None
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set_function(self, function: Callable[[], Samples]):
+        self.function = function
+
+    def collect(self) -> List[str]:
+        samples = self.function() if self.function else sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}" for labels, value in samples]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# HTTP
+http_request_duration = registry.register(Histogram(
+    "jbox_http_request_duration_seconds", "Time from request start to the last response byte.",
+    ("handler", "method", "status")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "jbox_http_requests_in_flight", "HTTP requests currently being served."
+))
+http_bytes = registry.register(Counter(
+    "jbox_http_bytes_total", "Request (in) and response (out) body bytes.", ("direction",)
+))
+
+# Discord
+discord_request_duration = registry.register(Histogram(
+    "jbox_discord_request_duration_seconds", "Latency of Discord API and CDN calls, excluding scheduler wait.",
+    ("operation", "shard")
+))
+discord_rate_limited = registry.register(Counter(
+    "jbox_discord_rate_limited_total", "Discord calls answered with 429.", ("operation", "shard")
+))
+discord_bytes = registry.register(Counter(
+    "jbox_discord_bytes_total", "Chunk bytes sent to and received from Discord.", ("direction",)
+))
+discord_requests_in_flight = registry.register(Gauge(
+    "jbox_discord_requests_in_flight", "Discord calls currently running per shard.", ("shard",)
+))
+chunk_uploads_in_flight = registry.register(Gauge(
+    "jbox_chunk_uploads_in_flight", "Chunk messages being sent per shard, including scheduler wait.", ("shard",)
+))
+
+# Database
+db_pool_checkout_wait = registry.register(Histogram(
+    "jbox_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection."
+))
+db_pool_connections = registry.register(Gauge(
+    "jbox_db_pool_connections", "Pooled database connections by state.", ("state",)
+))
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and body bytes.
+
+    Requests are labelled by the name of the endpoint function the router
+    matched, e.g. ``download_file``, so the label set stays small however
+    many files are served.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def receive_with_metrics():
+            message = await receive()
+            if message["type"] == "http.request":
+                http_bytes.inc("in", amount=len(message.get("body", b"")))
+            return message
+
+        async def send_with_metrics(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                http_bytes.inc("out", amount=len(message.get("body", b"")))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive_with_metrics, send_with_metrics)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched endpoint in the shared scope
+            handler = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, handler, scope["method"], str(status_code))
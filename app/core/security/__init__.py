@@ -2,11 +2,16 @@ from .jwt import (
     create_access_token,
     get_current_user,
     get_current_active_user,
-    oauth2_scheme
+    oauth2_scheme,
+    invalidate_user,
+    get_auth_cache_stats
 )
 from .password import (
     verify_password,
-    get_password_hash
+    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    get_password_hash_stats
 )
 
 __all__ = [
@@ -14,6 +19,11 @@ __all__ = [
     "get_current_user",
     "get_current_active_user",
     "oauth2_scheme",
+    "invalidate_user",
+    "get_auth_cache_stats",
     "verify_password",
-    "get_password_hash"
+    "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
+    "get_password_hash_stats"
 ]
\ No newline at end of file
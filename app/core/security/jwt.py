@@ -1,13 +1,14 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Set, Tuple
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
@@ -23,8 +24,109 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+class TokenCache:
+    """Bounded LRU of verified tokens and the user rows they resolve to.
+
+    Entries live for AUTH_CACHE_TTL seconds but never past the token's own
+    expiry, so a cached token is never accepted after decoding would have
+    rejected it. Entries of a user are dropped by invalidate_user().
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, str, float]]" = OrderedDict()
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, username, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def generation(self, username: str) -> int:
+        """Changes whenever the user is invalidated; see put()."""
+        return self._generations.get(username, 0)
+
+    def put(self, token: str, username: str, token_expiry: Optional[float], user, generation: int):
+        """Cache a verified token unless its user was invalidated since ``generation`` was read."""
+        if self.max_entries <= 0 or self.ttl <= 0 or generation != self.generation(username):
+            return
+        expires_at = time.time() + self.ttl
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)
+        self._remove(token)
+        self._entries[token] = (user, username, expires_at)
+        self._tokens_by_user.setdefault(username, set()).add(token)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, username: str):
+        self._generations[username] = self.generation(username) + 1
+        for token in list(self._tokens_by_user.get(username, ())):
+            self._remove(token)
+        self.invalidations += 1
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[1])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[1]]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl
+        }
+
+# The cache is per process, so invalidate_user() only reaches the worker
+# that made the change; other workers notice once their entries expire.
+# The cap bounds that window however AUTH_CACHE_TTL is configured.
+AUTH_CACHE_MAX_TTL = 60
+
+# Shared cache consulted before decoding tokens and loading users
+token_cache = TokenCache(settings.AUTH_CACHE_MAX_ENTRIES, min(settings.AUTH_CACHE_TTL, AUTH_CACHE_MAX_TTL))
+
+def invalidate_user(username: str):
+    """Forget this worker's cached tokens of a user; call after deactivation or a password change."""
+    token_cache.invalidate_user(username)
+
+def get_auth_cache_stats():
+    """Get hit/miss counters of the token cache."""
+    return token_cache.stats()
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get current user from JWT token."""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -38,10 +140,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(text("SELECT * FROM users WHERE username = :username"), {"username": username})
-    user = result.fetchone()
+    generation = token_cache.generation(username)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text("SELECT * FROM users WHERE username = :username"), {"username": username})
+        user = result.fetchone()
     if user is None:
         raise credentials_exception
+    token_cache.put(token, username, payload.get("exp"), user, generation)
     return user
 
 async def get_current_active_user(current_user = Depends(get_current_user)):
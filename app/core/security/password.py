@@ -1,5 +1,11 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
 from passlib.context import CryptContext
 
+from app.core.config import settings
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -9,4 +15,66 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     """Generate a password hash."""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+# bcrypt releases the GIL, so a thread pool keeps hashing off the event loop
+# without blocking streams. The semaphore makes extra callers queue in
+# asyncio, where their wait is measured, rather than inside the executor.
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+
+_stats = {
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "wait_total": 0.0,
+    "wait_max": 0.0,
+    "hash_total": 0.0,
+    "hash_max": 0.0
+}
+
+async def _run_in_hash_pool(func: Callable[..., Any], *args) -> Any:
+    enqueued = time.perf_counter()
+    _stats["queued"] += 1
+    try:
+        await _hash_slots.acquire()
+    finally:
+        _stats["queued"] -= 1
+    try:
+        started = time.perf_counter()
+        wait = started - enqueued
+        _stats["running"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_hash_pool, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            _stats["running"] -= 1
+            _stats["completed"] += 1
+            _stats["wait_total"] += wait
+            _stats["wait_max"] = max(_stats["wait_max"], wait)
+            _stats["hash_total"] += elapsed
+            _stats["hash_max"] = max(_stats["hash_max"], elapsed)
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password, hashed_password):
+    """Verify a password against its hash in the hashing pool."""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Generate a password hash in the hashing pool."""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+def get_password_hash_stats() -> Dict[str, Any]:
+    """Queue depth, queue wait and hashing time of the password hashing pool."""
+    completed = _stats["completed"]
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "queued": _stats["queued"],
+        "running": _stats["running"],
+        "completed": completed,
+        "avg_wait": round(_stats["wait_total"] / completed, 4) if completed else 0.0,
+        "max_wait": round(_stats["wait_max"], 4),
+        "avg_hash_time": round(_stats["hash_total"] / completed, 4) if completed else 0.0,
+        "max_hash_time": round(_stats["hash_max"], 4)
+    }
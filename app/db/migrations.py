@@ -0,0 +1,98 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint, UniqueConstraint
+
+from app.db.base import Base
+from app.logger import logger
+from app.services.naming_service import suffixed_name
+
+# Indexes earlier versions created that are no longer in the models
+OBSOLETE_INDEXES = (
+    # Duplicated the indexes behind uq_files_folder_id_name and uq_folders_user_id_name
+    "ix_files_folder_id_name_id",
+    "ix_folders_user_id_name_id",
+)
+
+# Name uniqueness constraints: (table, owner column, whether names keep their extension)
+NAME_CONSTRAINTS = {
+    "uq_files_folder_id_name": ("files", "folder_id", True),
+    "uq_folders_user_id_name": ("folders", "user_id", False),
+}
+
+def _rename_duplicates(connection: Connection, constraint_name: str):
+    """Give every row but the oldest of each duplicate name a ``_<id>`` suffix.
+
+    Older versions allowed duplicate names; the name constraints cannot be
+    added until they are gone. Files also rename their chunks' file_name.
+    """
+    table, owner, keep_extension = NAME_CONSTRAINTS[constraint_name]
+    result = connection.execute(
+        text(f"""
+            SELECT id, name FROM (
+                SELECT id, name, row_number() OVER (PARTITION BY {owner}, name ORDER BY id) AS position
+                FROM {table}
+            ) AS ranked
+            WHERE position > 1
+        """)
+    )
+    for row in result.fetchall():
+        name = suffixed_name(row.name, row.id, keep_extension)
+        connection.execute(text(f"UPDATE {table} SET name = :name WHERE id = :id"), {"name": name, "id": row.id})
+        if table == "files":
+            connection.execute(
+                text("UPDATE file_chunks SET file_name = :name WHERE file_id = :id"), {"name": name, "id": row.id}
+            )
+        logger.warning(f"Renamed duplicate {table} row {row.id} from {row.name} to {name}")
+
+def _column_ddl(connection: Connection, column) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=connection.dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if isinstance(default, str):
+            ddl += f" DEFAULT '{default}'"
+        else:
+            ddl += f" DEFAULT {default.compile(dialect=connection.dialect)}"
+    for foreign_key in column.foreign_keys:
+        ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+    return ddl
+
+def upgrade_schema(connection: Connection):
+    """Bring tables created by an older version up to the current models.
+
+    create_all only creates missing tables, so this adds the columns,
+    indexes and unique constraints that existing tables lack, and drops
+    OBSOLETE_INDEXES. Columns are
+    added as nullable: rows written before a column existed have no value
+    for it, and the code treats NULL as "unknown" for every such column.
+    Duplicate names are renamed before their constraint is added; if a
+    constraint still cannot be added, startup fails with RuntimeError.
+    Run with ``conn.run_sync(upgrade_schema)`` after create_all.
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(connection, column)}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+        constraints = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or not constraint.name or constraint.name in constraints:
+                continue
+            if constraint.name in NAME_CONSTRAINTS:
+                _rename_duplicates(connection, constraint.name)
+            try:
+                connection.execute(AddConstraint(constraint))
+            except Exception as e:
+                # Name allocation and the upserts rely on it; running without it would corrupt data
+                raise RuntimeError(f"Could not add constraint {constraint.name} to {table.name}: {str(e)}") from e
+            logger.info(f"Added constraint {constraint.name}")
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    for name in OBSOLETE_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -1,13 +1,30 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import logging
+import time
 
 from app.core.config import settings
+from app.core.metrics import db_pool_checkout_wait, db_pool_connections
+
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 10
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - start)
 
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
-    pool_size=10,
-    max_overflow=10,
+    echo=settings.DATABASE_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,
     pool_recycle=3600,
     connect_args={
@@ -16,6 +33,16 @@ engine = create_async_engine(
     }
 )
 
+def _pool_samples():
+    pool = engine.pool
+    return [
+        (("checked_out",), pool.checkedout()),
+        (("idle",), pool.checkedin()),
+        (("capacity",), DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    ]
+
+db_pool_connections.set_function(_pool_samples)
+
 AsyncSessionLocal = async_sessionmaker(
     engine, 
     class_=AsyncSession, 
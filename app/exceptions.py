@@ -24,6 +24,10 @@ class DiscordBotException(BaseAPIException):
     def __init__(self, detail: str = DISCORD_BOT_ERROR):
         super().__init__(detail=detail, status_code=503)
 
+class UploadBusyException(BaseAPIException):
+    def __init__(self, detail: str = UPLOAD_BUSY):
+        super().__init__(detail=detail, status_code=503)
+
 class ValidationException(BaseAPIException):
     def __init__(self, detail: str = INVALID_REQUEST):
         super().__init__(detail=detail, status_code=400)
@@ -78,6 +82,18 @@ async def discord_bot_exception_handler(request: Request, exc: DiscordBotExcepti
         }
     )
 
+async def upload_busy_exception_handler(request: Request, exc: UploadBusyException):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={
+            "data": [],
+            "message": UPLOAD_BUSY,
+            "error": str(exc.detail),
+            "status": False
+        }
+    )
+
 async def validation_exception_handler(request: Request, exc: ValidationException):
     return JSONResponse(
         status_code=400,
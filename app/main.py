@@ -5,16 +5,23 @@ import asyncio
 from fastapi.responses import FileResponse
 
 from app.db.base import Base
-from app.db.session import engine
-from app.services import start_bot, close_bot 
+from app.db.session import engine, AsyncSessionLocal
+from app.db.migrations import upgrade_schema
+from app.services import (
+    start_bot, close_bot, run_pack_compactor, run_delete_worker, run_upload_session_reaper,
+    run_writeback_flusher, run_staging_lease_renewer, backfill_files
+)
 from app.core.config import settings
-from app.routers import folders, files, status, root, test_db, auth
+from app.core.metrics import MetricsMiddleware
+from app.logger import logger
+from app.routers import folders, files, uploads, status, root, test_db, auth
 from app.exceptions import (
     BaseAPIException,
     NotFoundException,
     DatabaseException,
     FileOperationException,
     DiscordBotException,
+    UploadBusyException,
     ValidationException,
     base_exception_handler,
     general_exception_handler,
@@ -22,6 +29,7 @@ from app.exceptions import (
     database_exception_handler,
     file_operation_exception_handler,
     discord_bot_exception_handler,
+    upload_busy_exception_handler,
     validation_exception_handler
 )
 
@@ -42,12 +50,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency, in-flight and byte counters for every request, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include all routers
 app.include_router(test_db.router)
 app.include_router(root.router)
 app.include_router(auth.router)
 app.include_router(folders.router)
 app.include_router(files.router)
+app.include_router(uploads.router)
 app.include_router(status.router)
 
 @app.get('/favicon.ico', include_in_schema=False)
@@ -59,6 +71,7 @@ app.add_exception_handler(NotFoundException, not_found_exception_handler)
 app.add_exception_handler(DatabaseException, database_exception_handler)
 app.add_exception_handler(FileOperationException, file_operation_exception_handler)
 app.add_exception_handler(DiscordBotException, discord_bot_exception_handler)
+app.add_exception_handler(UploadBusyException, upload_busy_exception_handler)
 app.add_exception_handler(ValidationException, validation_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 
@@ -68,9 +81,32 @@ async def startup_event():
     # Create database tables if they don't exist
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # Add the columns, indexes and constraints older tables are missing
+        await conn.run_sync(upgrade_schema)
+    
+    # Files uploaded before the files table existed only have chunk rows
+    async with AsyncSessionLocal() as db:
+        backfilled = await backfill_files(db)
+    if backfilled:
+        logger.info(f"Created files rows for {backfilled} files uploaded by an older version")
     
     # Start Discord bot
-    await start_bot(settings.DISCORD_TOKEN)
+    await start_bot()
+    
+    # Periodically rewrite packs that are mostly deleted files
+    app.state.pack_compactor = asyncio.create_task(run_pack_compactor())
+    
+    # Drain queued message deletions in the background
+    app.state.delete_worker = asyncio.create_task(run_delete_worker())
+    
+    # Abort resumable uploads that were abandoned
+    app.state.upload_session_reaper = asyncio.create_task(run_upload_session_reaper())
+    
+    # Move write-back staged chunks to storage, resuming flushes from before a restart
+    app.state.writeback_flusher = asyncio.create_task(run_writeback_flusher())
+    
+    # Keep staged objects of running uploads safe from staging recovery
+    app.state.staging_lease_renewer = asyncio.create_task(run_staging_lease_renewer())
     
     # Configure logging
     import logging
@@ -84,6 +120,11 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on application shutdown."""
+    app.state.pack_compactor.cancel()
+    app.state.delete_worker.cancel()
+    app.state.upload_session_reaper.cancel()
+    app.state.writeback_flusher.cancel()
+    app.state.staging_lease_renewer.cancel()
     await close_bot()
 
 if __name__ == '__main__':
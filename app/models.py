@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, ForeignKey, Index, UniqueConstraint, Integer, BigInteger, String, Boolean, DateTime, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -18,17 +18,136 @@ class User(Base):
     # Relationships
     folders = relationship("Folder", back_populates="owner", cascade="all, delete-orphan")
 
+class File(Base):
+    """A stored file; its content is the FileChunk rows pointing at it, in chunk_id order."""
+    __tablename__ = "files"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    chunk_count = Column(Integer, nullable=False)
+    mime_type = Column(String)
+    category = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    folder = relationship("Folder", back_populates="files")
+    chunks = relationship("FileChunk", back_populates="file", order_by="FileChunk.chunk_id")
+    
+    __table_args__ = (
+        # Names are allocated by inserting and retrying on conflict, see naming_service
+        UniqueConstraint("folder_id", "name", name="uq_files_folder_id_name"),
+        # Keyset pagination by each sort order; the unique constraint's index
+        # serves name lookups and sorting by name
+        Index("ix_files_folder_id_size_id", "folder_id", "size", "id"),
+        Index("ix_files_folder_id_created_at_id", "folder_id", "created_at", "id"),
+    )
+
 class FileChunk(Base):
     __tablename__ = "file_chunks"
     
     id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("files.id"))  # Null while the chunk belongs to an upload session
+    upload_session_id = Column(String(32), ForeignKey("upload_sessions.id"))
     file_name = Column(String)
     chunk_id = Column(Integer)
-    discord_message_id = Column(String)
+    discord_message_id = Column(String, index=True)
+    shard = Column(Integer, default=0)  # Storage shard holding the message, -1 while in write-back staging
+    attachment_index = Column(Integer, default=0)  # Position among the message's attachments
+    pack_id = Column(Integer, ForeignKey("packs.id"), index=True)  # Set when stored inside a Pack
+    pack_offset = Column(Integer)  # Start of this chunk's stored bytes within the pack
+    size = Column(Integer)  # Bytes in this chunk, used to map HTTP ranges to chunks
+    attachment_url = Column(String)  # Discord CDN URL, read directly without fetch_message
+    url_expires_at = Column(DateTime(timezone=True))
+    content_hash = Column(String(64), index=True)  # SHA-256 of the chunk, see ChunkBlob
+    codec = Column(String)  # Compression codec of the stored bytes, None if stored raw
+    stored_size = Column(Integer)  # Bytes of the attachment on Discord
     folder_id = Column(Integer, ForeignKey("folders.id"))
     
-    # Relationship with Folder
+    # Relationships
     folder = relationship("Folder", back_populates="file_chunks")
+    file = relationship("File", back_populates="chunks")
+    
+    __table_args__ = (
+        # Reading a file walks its chunks in order
+        Index("ix_file_chunks_file_id_chunk_id", "file_id", "chunk_id"),
+        Index("ix_file_chunks_folder_id_file_name_chunk_id", "folder_id", "file_name", "chunk_id"),
+        # Each chunk of a resumable upload is committed once
+        Index("ix_file_chunks_upload_session_id_chunk_id", "upload_session_id", "chunk_id", unique=True),
+        # Chunks waiting in write-back staging, polled by the flusher
+        Index("ix_file_chunks_staged", "discord_message_id", postgresql_where=text("shard < 0")),
+    )
+
+class UploadSession(Base):
+    """A resumable upload; its chunks are file_chunks rows until it is finalized."""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(32), primary_key=True)  # Random token handed to the client
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False, index=True)
+    file_name = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)  # Chunk i covers bytes (i - 1) * chunk_size onwards
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class Pack(Base):
+    """A single attachment holding the stored bytes of many small files back to back."""
+    __tablename__ = "packs"
+    
+    id = Column(Integer, primary_key=True)
+    discord_message_id = Column(String, nullable=False, index=True)
+    shard = Column(Integer, default=0)
+    attachment_url = Column(String)
+    url_expires_at = Column(DateTime(timezone=True))
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_packs_staged", "discord_message_id", postgresql_where=text("shard < 0")),
+    )
+
+class ChunkBlob(Base):
+    """A chunk's content stored once on Discord and shared by every file containing it."""
+    __tablename__ = "chunk_blobs"
+    
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    discord_message_id = Column(String, nullable=False, index=True)
+    shard = Column(Integer, default=0)
+    attachment_index = Column(Integer, default=0)
+    pack_id = Column(Integer, ForeignKey("packs.id"), index=True)
+    pack_offset = Column(Integer)
+    size = Column(Integer)
+    codec = Column(String)
+    stored_size = Column(Integer)
+    attachment_url = Column(String)
+    url_expires_at = Column(DateTime(timezone=True))
+    ref_count = Column(Integer, nullable=False, default=1)  # file_chunks rows using this content
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_chunk_blobs_staged", "discord_message_id", postgresql_where=text("shard < 0")),
+    )
+
+class MessageDeletion(Base):
+    """A Discord message waiting to be deleted by the background delete worker."""
+    __tablename__ = "delete_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    discord_message_id = Column(String, nullable=False)
+    shard = Column(Integer, default=0)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class StagingLease(Base):
+    """A staged object whose upload has not committed yet; staging recovery leaves it alone until it expires."""
+    __tablename__ = "staging_leases"
+    
+    discord_message_id = Column(String, primary_key=True)  # Staged object key
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
 class Folder(Base):
     __tablename__ = "folders"
@@ -39,10 +158,22 @@ class Folder(Base):
     
     # Relationships
     owner = relationship("User", back_populates="folders")
+    files = relationship("File", back_populates="folder", cascade="all, delete-orphan")
     file_chunks = relationship("FileChunk", back_populates="folder", cascade="all, delete-orphan")
     
     # Folder name is unique per user
     __table_args__ = (
         # SQLAlchemy constraint for unique folder name per user
+        UniqueConstraint("user_id", "name", name="uq_folders_user_id_name"),
+        Index("ix_folders_user_id_id", "user_id", "id"),
         {"sqlite_autoincrement": True},
     )
+
+class NameCounter(Base):
+    """Next suffix to try for a name that is already taken in a folder or by a user."""
+    __tablename__ = "name_counters"
+    
+    scope = Column(String(16), primary_key=True)  # "file" (owner is a folder) or "folder" (owner is a user)
+    owner_id = Column(Integer, primary_key=True)
+    name = Column(String, primary_key=True)
+    next_suffix = Column(Integer, nullable=False)
@@ -1,3 +1,3 @@
-from . import folders, files, status, root, test_db, auth
+from . import folders, files, uploads, status, root, test_db, auth
 
-__all__ = ["folders", "files", "status", "root", "test_db", "auth"]
\ No newline at end of file
+__all__ = ["folders", "files", "uploads", "status", "root", "test_db", "auth"]
\ No newline at end of file
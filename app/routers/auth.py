@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
 from datetime import timedelta
 
 from app.db.session import get_db
-from app.schemas import UserCreate, UserResponse, Token, UserLogin
+from app.schemas import UserCreate, UserResponse, Token, UserLogin, PasswordChange
 from app.core.security import (
     create_access_token, 
     get_current_active_user
@@ -12,7 +13,9 @@ from app.core.security import (
 from app.core.config import settings
 from app.services import (
     create_user, 
-    authenticate_user
+    authenticate_user,
+    change_password,
+    set_user_active
 )
 from app.logger import logger
 from app.exceptions import DatabaseException, ValidationException
@@ -25,7 +28,7 @@ async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
         # Check if email or username already exists
         result = await db.execute(
-            "SELECT id FROM users WHERE email = :email OR username = :username", 
+            text("SELECT id, email FROM users WHERE email = :email OR username = :username"), 
             {"email": user.email, "username": user.username}
         )
         existing_user = result.fetchone()
@@ -98,4 +101,27 @@ async def login_with_credentials(user_data: UserLogin, db: AsyncSession = Depend
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user = Depends(get_current_active_user)):
     """Get information about the currently authenticated user."""
-    return current_user
\ No newline at end of file
+    return current_user
+
+# Writes to a user's password or active flag go through the user_service
+# helpers, which drop the user's cached tokens in this worker
+
+@router.put("/password")
+async def change_password_endpoint(
+    passwords: PasswordChange,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Change the current user's password."""
+    if not await authenticate_user(db, current_user.username, passwords.current_password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password")
+    await change_password(db, current_user.username, passwords.new_password)
+    logger.info(f"User {current_user.username} changed their password")
+    return {"message": "Password changed successfully"}
+
+@router.post("/deactivate")
+async def deactivate_endpoint(db: AsyncSession = Depends(get_db), current_user = Depends(get_current_active_user)):
+    """Deactivate the current user's account."""
+    await set_user_active(db, current_user.username, False)
+    logger.info(f"User {current_user.username} deactivated their account")
+    return {"message": "Account deactivated"}
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, UploadFile, Depends, Query, Response
+from fastapi import APIRouter, UploadFile, Depends, Query, Response, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import Optional
+from typing import Optional, List
 from fastapi.responses import JSONResponse
 from fastapi import status
 
@@ -11,12 +11,16 @@ from app.core.security import get_current_active_user
 from app.core.config import settings
 from app.exceptions import (
     NotFoundException, DatabaseException, FileOperationException, 
-    DiscordBotException, ValidationException
+    ValidationException, UploadBusyException
 )
 from app.services import (
-    get_folder_by_id, list_files, delete_file, get_file_chunks,
+    get_folder_by_id, list_files, delete_file,
+    get_file, get_file_by_id, list_file_chunks, get_file_info,
     create_file_download_stream, create_file_view_stream,
-    ensure_bot_ready, upload_file_chunk, get_file_metadata, 
+    get_cache_headers, is_not_modified, apply_if_range, not_modified_response,
+    ensure_storage_ready, upload_file_chunks, save_file_chunks, discard_uploaded_chunks,
+    upload_file_batch, save_file_batch,
+    get_file_metadata, RequestBodyReader,
     get_mime_type, is_file_viewable, get_file_type_category
 )
 from app.utils.constants import FILE_TYPE_NOT_SUPPORTED
@@ -27,86 +31,129 @@ router = APIRouter(tags=["files"])
 @router.post("/upload/")
 async def upload_file(file: UploadFile, folder_id: int, current_user = Depends(get_current_active_user)):
     """Upload a file to a specified folder."""
-    uploaded_chunks = []
+    uploaded_chunks = {}
     try:
-        channel = await ensure_bot_ready()
-        if not channel:
-            raise DiscordBotException("Discord channel not available")
+        await ensure_storage_ready()
         
         async with AsyncSessionLocal() as db:
             # Verify folder belongs to current user
             folder = await get_folder_by_id(db, folder_id, current_user.id)
             
-            filename, extension = file.filename.rsplit('.', 1) if '.' in file.filename else (file.filename, '')
-            result = await db.execute(
-                text("SELECT file_name FROM file_chunks WHERE file_name LIKE :file_name AND folder_id = :folder_id"),
-                {"file_name": f"{filename}%", "folder_id": folder_id}
+            chunk_count, total_size = await upload_file_chunks(file.read, file.filename, uploaded_chunks)
+            stored, dedup = await save_file_chunks(
+                db, file.filename, folder_id, chunk_count, total_size, uploaded_chunks
             )
-            existing_files = result.fetchall()
-            if existing_files:
-                count = len(existing_files)
-                file.filename = f"{filename}_{count + 1}.{extension}" if extension else f"{filename}_{count + 1}"
             
-            chunk_id = 0
-            total_size = 0
-
-            while True:
-                chunk = await file.read(settings.CHUNK_SIZE)
-                if not chunk:
-                    break
-                chunk_id += 1
-                total_size += len(chunk)
-                message_id = await upload_file_chunk(chunk, file.filename, chunk_id)
+            logger.info(
+                f"User {current_user.username} uploaded file {stored.name} to folder {folder_id} "
+                f"({dedup['chunks_reused']}/{chunk_count} chunks deduplicated)"
+            )
+            
+            # Enhanced response with file metadata
+            return {
+                "message": "File uploaded successfully",
+                "file": get_file_info(stored),
+                "dedup": dedup,
+                "status": True
+            }
+    
+    except Exception as e:
+        logger.error(f"Error during file upload by user {current_user.username}: {str(e)}")
+        # Handle cleanup of partially uploaded files
+        try:
+            await discard_uploaded_chunks(uploaded_chunks)
+        except Exception as cleanup_error:
+            logger.error(f"Error during cleanup: {cleanup_error}")
+        
+        raise FileOperationException(f"Error uploading file: {str(e)}")
 
-                chunk_entry = FileChunk(
-                    file_name=file.filename,
-                    chunk_id=chunk_id,
-                    discord_message_id=message_id,
-                    folder_id=folder_id
-                )
-                db.add(chunk_entry)
-                uploaded_chunks.append(chunk_entry)
+@router.put("/upload/stream/{filename}")
+async def upload_file_stream(
+    filename: str,
+    folder_id: int,
+    request: Request,
+    current_user = Depends(get_current_active_user)
+):
+    """Upload a file sent as the raw request body (not multipart), e.g. ``curl -T``.
 
-            await db.commit()
+    The body is read incrementally into pooled chunk buffers and each chunk
+    is sent to Discord as soon as it is full, while the client is still
+    uploading the rest. Nothing is spooled to disk.
+    """
+    uploaded_chunks = {}
+    try:
+        await ensure_storage_ready()
+        
+        async with AsyncSessionLocal() as db:
+            # Verify folder belongs to current user
+            await get_folder_by_id(db, folder_id, current_user.id)
             
-            logger.info(f"User {current_user.username} uploaded file {file.filename} to folder {folder_id}")
+            reader = RequestBodyReader(request.stream())
+            chunk_count, total_size = await upload_file_chunks(
+                reader.read, filename, uploaded_chunks, reader.release
+            )
+            stored, dedup = await save_file_chunks(
+                db, filename, folder_id, chunk_count, total_size, uploaded_chunks
+            )
             
-            # Enhanced response with file metadata
-            mime_type = get_mime_type(file.filename)
-            is_viewable = is_file_viewable(mime_type)
-            file_type = get_file_type_category(mime_type)
+            logger.info(
+                f"User {current_user.username} streamed file {stored.name} to folder {folder_id} "
+                f"({dedup['chunks_reused']}/{chunk_count} chunks deduplicated)"
+            )
             
             return {
                 "message": "File uploaded successfully",
-                "file": {
-                    "name": file.filename,
-                    "chunks": chunk_id,
-                    "size": total_size,
-                    "mime_type": mime_type,
-                    "viewable": is_viewable,
-                    "type": file_type
-                },
+                "file": get_file_info(stored),
+                "dedup": dedup,
                 "status": True
             }
     
     except Exception as e:
-        logger.error(f"Error during file upload by user {current_user.username}: {str(e)}")
+        logger.error(f"Error during streaming upload by user {current_user.username}: {str(e)}")
         # Handle cleanup of partially uploaded files
-        from app.services import delete_message
-        async with AsyncSessionLocal() as db:
-            for chunk_entry in uploaded_chunks:
-                try:
-                    await db.execute(
-                        "DELETE FROM file_chunks WHERE file_name = :file_name AND chunk_id = :chunk_id AND folder_id = :folder_id", 
-                        {"file_name": chunk_entry.file_name, "chunk_id": chunk_entry.chunk_id, "folder_id": chunk_entry.folder_id}
-                    )
-                    await delete_message(chunk_entry.discord_message_id)
-                except Exception as cleanup_error:
-                    logger.error(f"Error during cleanup: {cleanup_error}")
-            await db.commit()
+        try:
+            await discard_uploaded_chunks(uploaded_chunks)
+        except Exception as cleanup_error:
+            logger.error(f"Error during cleanup: {cleanup_error}")
         
+        if isinstance(e, UploadBusyException):
+            raise
         raise FileOperationException(f"Error uploading file: {str(e)}")
 
+@router.post("/upload/batch/")
+async def upload_files_batch(files: List[UploadFile], folder_id: int, current_user = Depends(get_current_active_user)):
+    """Upload several files at once, packing small files into shared Discord storage."""
+    uploads = []
+    try:
+        await ensure_storage_ready()
+        
+        async with AsyncSessionLocal() as db:
+            # Verify folder belongs to current user
+            await get_folder_by_id(db, folder_id, current_user.id)
+            
+            packs = await upload_file_batch(db, files, folder_id, uploads)
+            saved = await save_file_batch(db, folder_id, uploads, packs)
+            
+            logger.info(f"User {current_user.username} uploaded {len(uploads)} files to folder {folder_id}")
+            
+            uploaded_files = [{**get_file_info(stored), "dedup": dedup} for stored, dedup in saved]
+            
+            return {
+                "message": f"{len(uploaded_files)} files uploaded successfully",
+                "files": uploaded_files,
+                "status": True
+            }
+    
+    except Exception as e:
+        logger.error(f"Error during batch upload by user {current_user.username}: {str(e)}")
+        # Nothing was committed, so every message sent for this batch is discarded
+        try:
+            await discard_uploaded_chunks(*(entry["uploaded"] for entry in uploads))
+        except Exception as cleanup_error:
+            logger.error(f"Error during cleanup: {cleanup_error}")
+        
+        raise FileOperationException(f"Error uploading files: {str(e)}")
+
 @router.delete("/files/{file_name}")
 async def delete_file_endpoint(file_name: str, folder_id: int, current_user = Depends(get_current_active_user)):
     """Delete a file from a folder."""
@@ -120,69 +167,110 @@ async def delete_file_endpoint(file_name: str, folder_id: int, current_user = De
         raise
 
 @router.get("/files/{folder_id}")
-async def list_files_endpoint(folder_id: int, current_user = Depends(get_current_active_user)):
-    """List all files in a folder with enhanced metadata."""
+async def list_files_endpoint(
+    folder_id: int,
+    sort: str = Query("name", description="name, size or date"),
+    order: str = Query("asc", description="asc or desc"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    current_user = Depends(get_current_active_user)
+):
+    """List a page of the files in a folder with enhanced metadata.
+
+    Pass ``next_cursor`` back as ``cursor`` to get the following page.
+    """
     try:    
         async with AsyncSessionLocal() as db:
-            files = await list_files(db, folder_id, current_user.id)
+            files, next_cursor, total = await list_files(
+                db, folder_id, current_user.id, sort, order, limit, cursor, with_total
+            )
             logger.info(f"User {current_user.username} listed files in folder {folder_id}")
-            return {"files": files, "status": True, "count": len(files)}
+            return {
+                "files": files,
+                "status": True,
+                "count": len(files),
+                "next_cursor": next_cursor,
+                "total": total
+            }
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}")
         raise
 
 @router.get("/download/{filename}")
-async def download_file(filename: str, folder_id: int, current_user = Depends(get_current_active_user)):
+async def download_file(
+    filename: str, 
+    folder_id: int, 
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since"),
+    current_user = Depends(get_current_active_user)
+):
     """Download a file from a folder."""
     try:
         async with AsyncSessionLocal() as db:
-            chunks = await get_file_chunks(db, filename, folder_id, current_user.id)
+            file = await get_file(db, filename, folder_id, current_user.id)
+            chunks = await list_file_chunks(db, file.id)
+            cache_headers = get_cache_headers(file, chunks)
+            if is_not_modified(cache_headers, if_none_match, if_modified_since):
+                return not_modified_response(cache_headers)
             logger.info(f"User {current_user.username} downloaded file {filename} from folder {folder_id}")
-            return await create_file_download_stream(filename, chunks)
+            range_header = apply_if_range(range_header, if_range, cache_headers)
+            return await create_file_download_stream(filename, chunks, range_header, cache_headers)
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         raise FileOperationException(f"Error downloading file: {str(e)}")  
 
 @router.get("/open/{name}")
-async def open_file(name: str, folder_id: int, current_user = Depends(get_current_active_user)):
+async def open_file(
+    name: str, 
+    folder_id: int, 
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since"),
+    current_user = Depends(get_current_active_user)
+):
     """Open a file for viewing in the browser with improved handling."""
     try:
         async with AsyncSessionLocal() as db:
-            chunks = await get_file_chunks(db, name, folder_id, current_user.id)
+            file = await get_file(db, name, folder_id, current_user.id)
+            chunks = await list_file_chunks(db, file.id)
+            cache_headers = get_cache_headers(file, chunks)
+            if is_not_modified(cache_headers, if_none_match, if_modified_since):
+                return not_modified_response(cache_headers)
             logger.info(f"User {current_user.username} opened file {name} from folder {folder_id}")
-            return await create_file_view_stream(name, chunks)
+            range_header = apply_if_range(range_header, if_range, cache_headers)
+            return await create_file_view_stream(name, chunks, range_header, cache_headers)
     except Exception as e:
         logger.error(f"Error opening file: {str(e)}")
         raise FileOperationException(f"Error opening file: {str(e)}")
 
 @router.get("/view/{id}")
-async def view_file_by_id(id: int, current_user = Depends(get_current_active_user)):
+async def view_file_by_id(
+    id: int, 
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since"),
+    current_user = Depends(get_current_active_user)
+):
     """View a file by its ID."""
     try:
         async with AsyncSessionLocal() as db:
             # Get file info and verify ownership
-            result = await db.execute(
-                """
-                SELECT fc.file_name, fc.folder_id, f.user_id 
-                FROM file_chunks fc 
-                JOIN folders f ON fc.folder_id = f.id 
-                WHERE fc.id = :id
-                """,
-                {"id": id}
-            )
-            file_info = result.fetchone()
-            
-            if not file_info:
-                raise NotFoundException(f"File with id {id} not found")
-                
-            # Check if file belongs to current user
-            if file_info.user_id != current_user.id:
-                raise FileOperationException("You don't have permission to access this file")
+            file = await get_file_by_id(db, id, current_user.id)
             
             # Now get the file chunks and return the streaming response
-            chunks = await get_file_chunks(db, file_info.file_name, file_info.folder_id, current_user.id)
-            logger.info(f"User {current_user.username} viewed file {file_info.file_name}")
-            return await create_file_view_stream(file_info.file_name, chunks)
+            chunks = await list_file_chunks(db, file.id)
+            # A file id always names the same content, so it can be cached for good
+            cache_headers = get_cache_headers(file, chunks, immutable=True)
+            if is_not_modified(cache_headers, if_none_match, if_modified_since):
+                return not_modified_response(cache_headers)
+            logger.info(f"User {current_user.username} viewed file {file.name}")
+            range_header = apply_if_range(range_header, if_range, cache_headers)
+            return await create_file_view_stream(file.name, chunks, range_header, cache_headers)
             
     except Exception as e:
         logger.error(f"Error viewing file: {str(e)}")
@@ -215,12 +303,12 @@ async def check_file_support(filename: str, folder_id: int, current_user = Depen
     try:
         async with AsyncSessionLocal() as db:
             # Check if file exists and belongs to user
-            await get_file_chunks(db, filename, folder_id, current_user.id)
+            file = await get_file(db, filename, folder_id, current_user.id)
             
             # Get MIME type info
-            mime_type = get_mime_type(filename)
+            mime_type = file.mime_type or get_mime_type(filename)
             is_viewable = is_file_viewable(mime_type)
-            file_type = get_file_type_category(mime_type)
+            file_type = file.category or get_file_type_category(mime_type)
             
             # Create response with appropriate headers
             response = Response()
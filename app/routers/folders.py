@@ -1,12 +1,16 @@
 # app/routers/folders.py
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
+from typing import Optional
+from app.core.config import settings
+from app.db.session import get_db, AsyncSessionLocal
 from app.logger import logger
 from app.core.security import get_current_active_user
 from app.exceptions import ValidationException
 from app.utils.constants import EMPTY_FOLDER_NAME
-from app.services import create_folder, delete_folder, list_folders
+from app.services import (
+    create_folder, delete_folder, list_folders, get_folder_by_id, create_folder_archive_stream
+)
 
 router = APIRouter(tags=["folders"])
 
@@ -44,12 +48,48 @@ async def delete_folder_endpoint(folder_name: str, db: AsyncSession = Depends(ge
         raise
 
 @router.get("/folders/")
-async def list_folders_endpoint(db: AsyncSession = Depends(get_db), current_user = Depends(get_current_active_user)):
-    """List all folders belonging to the current user."""
+async def list_folders_endpoint(
+    response: Response,
+    sort: str = Query("name", description="name or date"),
+    order: str = Query("asc", description="asc or desc"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """List a page of the folders belonging to the current user.
+
+    The body stays a plain list; the token for the next page is returned in
+    the X-Next-Cursor header and the total, when requested, in X-Total-Count.
+    """
     try:
-        folders = await list_folders(db, current_user.id)
+        folders, next_cursor, total = await list_folders(
+            db, current_user.id, sort, order, limit, cursor, with_total
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
         logger.info(f"Folder list fetched successfully for user {current_user.username}")
         return folders
     except Exception as e:
         logger.error(f"Error fetching folder list: {e}")
-        raise
\ No newline at end of file
+        raise
+
+@router.get("/folders/{folder_id}/archive")
+async def download_folder_archive(
+    folder_id: int,
+    compression: str = Query("store", description="store or deflate"),
+    current_user = Depends(get_current_active_user)
+):
+    """Download every file in a folder as one ZIP archive, streamed as it is built."""
+    try:
+        # The session is closed before streaming; the archive reads its own pages
+        async with AsyncSessionLocal() as db:
+            folder = await get_folder_by_id(db, folder_id, current_user.id)
+        logger.info(f"User {current_user.username} downloaded folder {folder_id} as an archive")
+        return create_folder_archive_stream(folder, compression)
+    except Exception as e:
+        logger.error(f"Error downloading folder archive: {str(e)}")
+        raise
@@ -1,8 +1,14 @@
 # app/routers/status.py
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from app.logger import logger
 from app.exceptions import DiscordBotException
-from app.services import get_bot_status
+from app.core.metrics import registry
+from app.core.security import get_auth_cache_stats, get_password_hash_stats
+from app.services import (
+    get_bot_status, get_cache_stats, get_scheduler_stats, get_upload_buffer_stats, get_storage_stats,
+    get_writeback_stats
+)
 
 router = APIRouter(tags=["status"])
 
@@ -14,4 +20,44 @@ async def get_status_endpoint():
         return await get_bot_status()
     except Exception as e:
         logger.error("Error getting bot status: %s", e)
-        raise DiscordBotException(f"Error getting bot status: {str(e)}")
\ No newline at end of file
+        raise DiscordBotException(f"Error getting bot status: {str(e)}")
+
+@router.get("/status/storage")
+async def get_storage_status_endpoint():
+    """Get the backend kind and upload load of every storage shard."""
+    return await get_storage_stats()
+
+@router.get("/status/writeback")
+async def get_writeback_status_endpoint():
+    """Get the staged data still waiting to be flushed to storage."""
+    return await get_writeback_stats()
+
+@router.get("/status/cache")
+async def get_cache_status_endpoint():
+    """Get hit/miss counters and usage of the local chunk cache."""
+    return await get_cache_stats()
+
+@router.get("/status/scheduler")
+async def get_scheduler_status_endpoint():
+    """Get queue depth and wait times of the Discord request scheduler per priority lane."""
+    return await get_scheduler_stats()
+
+@router.get("/status/auth")
+async def get_auth_cache_status_endpoint():
+    """Get hit/miss counters of the authentication token cache."""
+    return get_auth_cache_stats()
+
+@router.get("/status/password-hashing")
+async def get_password_hashing_status_endpoint():
+    """Get queue depth, queue wait and hashing time of the password hashing pool."""
+    return get_password_hash_stats()
+
+@router.get("/status/upload-buffers")
+async def get_upload_buffer_status_endpoint():
+    """Get usage of the buffer pool shared by streaming uploads."""
+    return await get_upload_buffer_stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics_endpoint():
+    """Expose request, Discord and database pool metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.logger import logger
+from app.core.security import get_current_active_user
+from app.exceptions import ValidationException, FileOperationException
+from app.services import (
+    get_folder_by_id, ensure_storage_ready, get_file_info, RequestBodyReader,
+    create_upload_session, get_upload_session, get_upload_session_status,
+    is_chunk_committed, validate_chunk_id, get_chunk_length,
+    store_session_chunk, finalize_upload_session, abort_upload_session
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+@router.post("/")
+async def create_upload_session_endpoint(
+    folder_id: int,
+    file_name: str,
+    size: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Start a resumable upload of ``size`` bytes.
+
+    Send the data as chunks of ``chunk_size`` bytes to
+    ``PUT /uploads/{id}/chunks/{chunk_id}`` (1-based), in any order and in
+    parallel, then call ``POST /uploads/{id}/finalize``.
+    """
+    await get_folder_by_id(db, folder_id, current_user.id)
+    session = await create_upload_session(db, current_user.id, folder_id, file_name, size)
+    logger.info(f"User {current_user.username} started upload session {session.id} for {file_name}")
+    return {"upload": await get_upload_session_status(db, session), "status": True}
+
+@router.get("/{session_id}")
+async def get_upload_session_endpoint(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Get the chunks and byte ranges already committed for an upload."""
+    session = await get_upload_session(db, session_id, current_user.id)
+    return {"upload": await get_upload_session_status(db, session), "status": True}
+
+@router.put("/{session_id}/chunks/{chunk_id}")
+async def put_upload_chunk_endpoint(
+    session_id: str,
+    chunk_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Store one chunk of an upload, sent as the raw request body.
+
+    Chunks that are already committed are acknowledged without reading the body.
+    """
+    session = await get_upload_session(db, session_id, current_user.id)
+    validate_chunk_id(session, chunk_id)
+    if await is_chunk_committed(db, session_id, chunk_id):
+        return {"chunk_id": chunk_id, "committed": True, "stored": False, "status": True}
+    # Do not hold a pooled connection while the body and Discord upload run
+    await db.close()
+
+    await ensure_storage_ready()
+
+    reader = RequestBodyReader(request.stream())
+    data = await reader.read(get_chunk_length(session, chunk_id))
+    try:
+        if not await reader.at_end():
+            raise ValidationException(f"Chunk {chunk_id} is longer than {get_chunk_length(session, chunk_id)} bytes")
+        stored = await store_session_chunk(session, chunk_id, data)
+    except ValidationException:
+        raise
+    except Exception as e:
+        logger.error(f"Error storing chunk {chunk_id} of upload session {session_id}: {str(e)}")
+        raise FileOperationException(f"Error uploading chunk: {str(e)}")
+    finally:
+        await reader.release(data)
+    return {"chunk_id": chunk_id, "committed": True, "stored": stored, "status": True}
+
+@router.post("/{session_id}/finalize")
+async def finalize_upload_session_endpoint(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Create the file once every chunk of the upload is committed."""
+    session = await get_upload_session(db, session_id, current_user.id)
+    file = await finalize_upload_session(db, session)
+    logger.info(f"User {current_user.username} finalized upload session {session_id} as {file.name}")
+    return {"message": "File uploaded successfully", "file": get_file_info(file), "status": True}
+
+@router.delete("/{session_id}")
+async def abort_upload_session_endpoint(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Cancel an upload and discard the chunks stored so far."""
+    session = await get_upload_session(db, session_id, current_user.id)
+    await abort_upload_session(db, session.id)
+    await db.commit()
+    logger.info(f"User {current_user.username} aborted upload session {session_id}")
+    return {"message": f"Upload session {session_id} aborted", "status": True}
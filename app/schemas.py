@@ -7,21 +7,32 @@ class UserBase(BaseModel):
     username: str
     email: EmailStr
 
+def check_password_complexity(v: str) -> str:
+    if not any(char.isdigit() for char in v):
+        raise ValueError('Password must contain at least one digit')
+    if not any(char.isupper() for char in v):
+        raise ValueError('Password must contain at least one uppercase letter')
+    return v
+
 class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
     
     @validator('password')
     def password_complexity(cls, v):
-        if not any(char.isdigit() for char in v):
-            raise ValueError('Password must contain at least one digit')
-        if not any(char.isupper() for char in v):
-            raise ValueError('Password must contain at least one uppercase letter')
-        return v
+        return check_password_complexity(v)
 
 class UserLogin(BaseModel):
     username: str
     password: str
 
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str = Field(..., min_length=8)
+    
+    @validator('new_password')
+    def password_complexity(cls, v):
+        return check_password_complexity(v)
+
 class UserResponse(UserBase):
     id: int
     is_active: bool
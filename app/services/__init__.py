@@ -2,7 +2,9 @@ from .user_service import (
     get_user_by_email,
     get_user_by_username,
     create_user,
-    authenticate_user
+    authenticate_user,
+    set_user_active,
+    change_password
 )
 from .folder_service import (
     create_folder,
@@ -14,20 +16,108 @@ from .file_service import (
     list_files,
     delete_file,
     get_file_chunks,
+    get_file,
+    get_file_by_id,
+    list_file_chunks,
+    get_file_info,
+    upload_file_chunks,
+    save_file_chunks,
+    discard_uploaded_chunks,
+    add_file,
+    backfill_files,
+    upload_file_batch,
+    save_file_batch,
     create_file_download_stream,
     create_file_view_stream,
+    get_cache_headers,
+    is_not_modified,
+    apply_if_range,
+    not_modified_response,
     get_file_metadata,
     get_mime_type,
     is_file_viewable,
     get_file_type_category
 )
+from .naming_service import (
+    insert_with_unique_name,
+    next_name_suffix
+)
+from .upload_session_service import (
+    create_upload_session,
+    get_upload_session,
+    get_upload_session_status,
+    get_chunk_length,
+    is_chunk_committed,
+    validate_chunk_id,
+    store_session_chunk,
+    finalize_upload_session,
+    abort_upload_session,
+    expire_upload_sessions,
+    run_upload_session_reaper
+)
+from .cache_service import (
+    chunk_cache,
+    get_cache_stats
+)
+from .stream_service import (
+    BufferPool,
+    RequestBodyReader,
+    upload_buffer_pool,
+    get_upload_buffer_stats
+)
+from .pack_service import (
+    compact_packs,
+    run_pack_compactor
+)
+from .delete_service import (
+    enqueue_deletions,
+    schedule_deletions,
+    process_delete_outbox,
+    run_delete_worker
+)
+from .storage_service import (
+    StorageBackend,
+    DiscordBackend,
+    LocalDiskBackend,
+    S3Backend,
+    StagingBackend,
+    STAGING_SHARD,
+    backends,
+    get_backend,
+    pick_shard,
+    PLACEMENT_POLICIES,
+    ensure_storage_ready,
+    upload_file_chunk,
+    upload_chunk_batch,
+    get_storage_stats
+)
+from .archive_service import (
+    ARCHIVE_METHODS,
+    stream_folder_archive,
+    create_folder_archive_stream
+)
+from .writeback_service import (
+    flush_staged_object,
+    flush_staging,
+    recover_staging,
+    renew_staging_leases,
+    get_writeback_stats,
+    run_writeback_flusher,
+    run_staging_lease_renewer
+)
 from .discord_service import (
     bot,
+    bots,
+    get_bot,
     ensure_bot_ready,
-    upload_file_chunk,
     get_bot_status,
     fetch_message,
     delete_message,
+    delete_messages,
+    bulk_delete_messages,
+    download_attachment,
+    refresh_attachment_urls,
+    get_scheduler_stats,
     start_bot,
     close_bot
 )
@@ -35,18 +125,57 @@ from .discord_service import (
 __all__ = [
     # User services
     "get_user_by_email", "get_user_by_username", 
-    "create_user", "authenticate_user",
+    "create_user", "authenticate_user", "set_user_active", "change_password",
     
     # Folder services
     "create_folder", "delete_folder", "list_folders", "get_folder_by_id",
     
     # File services
-    "list_files", "delete_file", "get_file_chunks", 
+    "list_files", "delete_file", "get_file_chunks", "get_file", "get_file_by_id",
+    "list_file_chunks", "get_file_info", "upload_file_chunks",
+    "save_file_chunks", "discard_uploaded_chunks",
+    "add_file", "backfill_files", "upload_file_batch", "save_file_batch",
     "create_file_download_stream", "create_file_view_stream",
+    "get_cache_headers", "is_not_modified", "apply_if_range", "not_modified_response",
     "get_file_metadata", "get_mime_type",
-    "is_file_viewable", "get_file_type_category"
+    "is_file_viewable", "get_file_type_category",
+    
+    # Naming services
+    "insert_with_unique_name", "next_name_suffix",
+    
+    # Upload session services
+    "create_upload_session", "get_upload_session", "get_upload_session_status",
+    "get_chunk_length", "is_chunk_committed", "validate_chunk_id", "store_session_chunk",
+    "finalize_upload_session", "abort_upload_session", "expire_upload_sessions",
+    "run_upload_session_reaper",
+    
+    # Cache services
+    "chunk_cache", "get_cache_stats",
+    
+    # Stream services
+    "BufferPool", "RequestBodyReader", "upload_buffer_pool", "get_upload_buffer_stats",
+    
+    # Pack services
+    "compact_packs", "run_pack_compactor",
+    
+    # Delete services
+    "enqueue_deletions", "schedule_deletions", "process_delete_outbox", "run_delete_worker",
+    
+    # Storage services
+    "StorageBackend", "DiscordBackend", "LocalDiskBackend", "S3Backend", "StagingBackend", "STAGING_SHARD",
+    "backends", "get_backend", "pick_shard", "PLACEMENT_POLICIES", "ensure_storage_ready", "upload_file_chunk",
+    "upload_chunk_batch", "get_storage_stats",
+    
+    # Archive services
+    "ARCHIVE_METHODS", "stream_folder_archive", "create_folder_archive_stream",
+    
+    # Write-back services
+    "flush_staged_object", "flush_staging", "recover_staging", "renew_staging_leases", "get_writeback_stats",
+    "run_writeback_flusher", "run_staging_lease_renewer",
     
     # Discord services
-    "bot", "ensure_bot_ready", "upload_file_chunk", "get_bot_status",
-    "fetch_message", "delete_message", "start_bot", "close_bot"
+    "bot", "bots", "get_bot", "ensure_bot_ready", "get_bot_status",
+    "fetch_message", "delete_message", "delete_messages", "bulk_delete_messages",
+    "download_attachment",
+    "refresh_attachment_urls", "get_scheduler_stats", "start_bot", "close_bot"
 ]
\ No newline at end of file
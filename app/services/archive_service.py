@@ -0,0 +1,161 @@
+import asyncio
+import zipfile
+from contextlib import aclosing
+from datetime import timezone
+from functools import partial
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, text
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.exceptions import ValidationException
+from app.logger import logger
+from app.models import FileChunk
+from app.services.file_service import prefetch_chunks, read_chunk, refresh_chunk_urls
+from app.services.naming_service import suffixed_name
+
+# Public names of the supported compression methods
+ARCHIVE_METHODS = {"store": zipfile.ZIP_STORED, "deflate": zipfile.ZIP_DEFLATED}
+
+class _ArchiveSink:
+    """Write-only file object collecting what zipfile writes until it is drained.
+
+    It has no tell() or seek(), so zipfile streams: entries get data
+    descriptors instead of rewritten headers, and nothing is ever read back.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def _entry_name(file, used: Set[str]) -> str:
+    """A flat entry name not yet in ``used``, which it is added to."""
+    # Entries stay flat, whatever separators a file name contains, so
+    # a/b and a_b would collide without the suffix
+    base = file.name.replace("\\", "_").replace("/", "_")
+    name = base
+    suffix = 2
+    while name in used:
+        name = suffixed_name(base, suffix)
+        suffix += 1
+    used.add(name)
+    return name
+
+def _zip_info(file, name: str, size: int, method: str) -> zipfile.ZipInfo:
+    date_time = file.created_at.astimezone(timezone.utc).timetuple()[:6] if file.created_at else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(name, date_time=max(date_time, (1980, 1, 1, 0, 0, 0)))
+    info.compress_type = ARCHIVE_METHODS[method]
+    # zipfile reserves ZIP64 fields up front when the expected size needs them
+    info.file_size = size
+    return info
+
+async def _load_archive_page(folder_id: int, after_id: int) -> Tuple[list, Dict[int, List[FileChunk]]]:
+    """The next ARCHIVE_PAGE_SIZE files of a folder by id and their chunks."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("""
+                SELECT id, name, size, chunk_count, created_at FROM files
+                WHERE folder_id = :folder_id AND id > :after_id
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {"folder_id": folder_id, "after_id": after_id, "limit": settings.ARCHIVE_PAGE_SIZE}
+        )
+        files = result.fetchall()
+        if not files:
+            return [], {}
+        result = await db.execute(
+            select(FileChunk)
+            .where(FileChunk.file_id.in_([file.id for file in files]))
+            .order_by(FileChunk.file_id, FileChunk.chunk_id)
+        )
+        chunks: Dict[int, List[FileChunk]] = {}
+        for chunk in result.scalars().all():
+            chunks.setdefault(chunk.file_id, []).append(chunk)
+    return files, chunks
+
+async def stream_folder_archive(folder_id: int, method: str = "store") -> AsyncIterator[bytes]:
+    """Stream a ZIP of every file in a folder, built while it is sent.
+
+    Files are read a page at a time and each page's chunks go through one
+    prefetch_chunks pipeline, so the next files download while the current
+    one is sent. Memory is bounded by the prefetch window plus the central
+    directory, which holds a small record per file; nothing is written to
+    disk. Files deleted while the archive is being built are left out.
+    """
+    sink = _ArchiveSink()
+    archive = zipfile.ZipFile(
+        sink, "w",
+        compression=ARCHIVE_METHODS[method],
+        compresslevel=settings.ARCHIVE_COMPRESSION_LEVEL,
+        allowZip64=True
+    )
+    written = 0
+    after_id = 0
+    names: Set[str] = set()
+    while True:
+        files, chunks_by_file = await _load_archive_page(folder_id, after_id)
+        if not files:
+            break
+        after_id = files[-1].id
+        files = [file for file in files if len(chunks_by_file.get(file.id, [])) == file.chunk_count]
+        chunks = [chunk for file in files for chunk in chunks_by_file.get(file.id, [])]
+        await refresh_chunk_urls(chunks)
+
+        messages = {}
+        fetch = partial(read_chunk, messages=messages)
+        try:
+            async with aclosing(prefetch_chunks(chunks, fetch)) as stream:
+                for file in files:
+                    file_chunks = chunks_by_file.get(file.id, [])
+                    # Files backfilled from chunk rows have no size of their own
+                    sizes = [chunk.size for chunk in file_chunks]
+                    unknown = None in sizes
+                    info = _zip_info(file, _entry_name(file, names), 0 if unknown else sum(sizes), method)
+                    with archive.open(info, "w", force_zip64=unknown) as entry:
+                        for _ in range(file.chunk_count):
+                            _, data = await anext(stream)
+                            if method == "store":
+                                entry.write(data)
+                            else:
+                                # Deflating a whole chunk would stall the event loop
+                                await asyncio.to_thread(entry.write, data)
+                            data = None
+                            if sink.buffer:
+                                yield sink.drain()
+                    yield sink.drain()
+                    written += 1
+        finally:
+            for task in messages.values():
+                task.cancel()
+
+    archive.close()
+    yield sink.drain()
+    logger.info(f"Streamed archive of folder {folder_id} with {written} files")
+
+def create_folder_archive_stream(folder, method: str = "store") -> StreamingResponse:
+    """Create a streaming response with a ZIP archive of a folder."""
+    if method not in ARCHIVE_METHODS:
+        raise ValidationException(f"Unknown compression method {method}, use one of {', '.join(ARCHIVE_METHODS)}")
+    filename = f"{folder.name}.zip"
+    return StreamingResponse(
+        stream_folder_archive(folder.id, method),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-File-Name": filename,
+            "Cache-Control": "no-cache"
+        }
+    )
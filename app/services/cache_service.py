@@ -0,0 +1,162 @@
+import asyncio
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.logger import logger
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _write_atomic(directory: str, path: str, data: bytes):
+    # Write to a temp file in the same directory, then rename over the target
+    # so readers never observe a partially written chunk.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class ChunkCache:
+    """Size-bounded on-disk LRU cache of chunk bytes.
+
+    Entries are keyed by Discord message id; uploaded chunks never change,
+    so entries never need invalidating. The index lives in memory and is
+    rebuilt from the directory on first use, oldest access first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.chunk")
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                # Left behind by a write interrupted by a crash
+                _remove_files([entry.path])
+            elif entry.name.endswith(".chunk"):
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name[:-len(".chunk")], stat.st_size))
+        return sorted(found)
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            for _, key, size in await asyncio.to_thread(self._scan):
+                self._entries[key] = size
+                self._size += size
+            self._loaded = True
+            logger.info(f"Chunk cache loaded {len(self._entries)} entries ({self._size} bytes)")
+        await self._evict()
+
+    def contains(self, key: str) -> bool:
+        """Cheap membership check that does not touch LRU order or counters."""
+        return self.enabled and key in self._entries
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for ``key``, or None on a miss."""
+        if not self.enabled:
+            return None
+        await self._ensure_loaded()
+        async with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            data = await asyncio.to_thread(_read_file, self._path(key))
+        except FileNotFoundError:
+            # Evicted between the index lookup and the read
+            async with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    async def put(self, key: str, data: bytes):
+        """Store ``data`` under ``key`` and evict least recently used entries."""
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        await self._ensure_loaded()
+        async with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+        try:
+            await asyncio.to_thread(_write_atomic, self.directory, self._path(key), data)
+        except OSError as e:
+            logger.warning(f"Could not write chunk {key} to cache: {str(e)}")
+            return
+        async with self._lock:
+            if key not in self._entries:
+                self._entries[key] = len(data)
+                self._size += len(data)
+        await self._evict()
+
+    async def _evict(self):
+        evicted = []
+        async with self._lock:
+            while self._size > self.max_bytes and self._entries:
+                key, size = self._entries.popitem(last=False)
+                self._size -= size
+                self.evictions += 1
+                evicted.append(self._path(key))
+        if evicted:
+            await asyncio.to_thread(_remove_files, evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters used to size the cache against real traffic."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes
+        }
+
+# Shared cache instance used by the download and view streams
+chunk_cache = ChunkCache(settings.CHUNK_CACHE_DIR, settings.CHUNK_CACHE_MAX_BYTES)
+
+async def get_cache_stats():
+    """Get hit/miss counters and usage of the local chunk cache."""
+    return chunk_cache.stats()
@@ -0,0 +1,89 @@
+import asyncio
+import lzma
+import zlib
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+# Formats that are already compressed; recompressing them only burns CPU
+COMPRESSED_MIME_PREFIXES = [
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+    'image/webp',
+    'image/avif',
+    'image/heic',
+    'video/',
+    'audio/',
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/x-bzip2',
+    'application/x-xz',
+    'application/x-7z-compressed',
+    'application/x-rar-compressed',
+    'application/vnd.rar',
+    'application/zstd',
+    'application/pdf',
+    'application/java-archive',
+    'application/vnd.openxmlformats-officedocument.',
+]
+
+CODECS = {
+    "zlib": (
+        lambda data: zlib.compress(data, 6),
+        zlib.decompress
+    ),
+    "lzma": (
+        lambda data: lzma.compress(data, preset=1),
+        lzma.decompress
+    ),
+}
+
+def is_compressible_type(mime_type: str) -> bool:
+    """Whether a MIME type is worth trying to compress at all."""
+    return not any(mime_type.startswith(prefix) for prefix in COMPRESSED_MIME_PREFIXES)
+
+def _enabled_codecs():
+    names = [name.strip() for name in settings.COMPRESSION_CODECS.split(",")]
+    return [name for name in names if name in CODECS]
+
+def choose_codec(chunk: bytes) -> Optional[str]:
+    """Pick the codec that shrinks a sample of the chunk the most.
+
+    Returns None when no codec gets the sample below COMPRESSION_MAX_RATIO,
+    i.e. the data is effectively incompressible.
+    """
+    sample = chunk[:settings.COMPRESSION_SAMPLE_BYTES]
+    if not sample:
+        return None
+    best_codec, best_size = None, settings.COMPRESSION_MAX_RATIO * len(sample)
+    for name in _enabled_codecs():
+        size = len(CODECS[name][0](sample))
+        if size < best_size:
+            best_codec, best_size = name, size
+    return best_codec
+
+def _compress(chunk: bytes, mime_type: str) -> Tuple[bytes, Optional[str]]:
+    if not settings.COMPRESSION_ENABLED or not is_compressible_type(mime_type):
+        return chunk, None
+    codec = choose_codec(chunk)
+    if codec is None:
+        return chunk, None
+    compressed = CODECS[codec][0](chunk)
+    if len(compressed) >= len(chunk) * settings.COMPRESSION_MAX_RATIO:
+        # The sample was not representative of the whole chunk
+        return chunk, None
+    return compressed, codec
+
+async def compress_chunk(chunk: bytes, mime_type: str) -> Tuple[bytes, Optional[str]]:
+    """Compress a chunk if it pays off. Returns (payload, codec or None)."""
+    return await asyncio.to_thread(_compress, chunk, mime_type)
+
+async def decompress_chunk(data: bytes, codec: Optional[str]) -> bytes:
+    """Undo compress_chunk for a payload stored with ``codec``."""
+    if not codec:
+        return data
+    if codec not in CODECS:
+        raise ValueError(f"Unknown chunk codec {codec}")
+    return await asyncio.to_thread(CODECS[codec][1], data)
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text, bindparam
+from typing import Any, Dict, List, Tuple
+
+from app.db.session import AsyncSessionLocal
+from app.exceptions import FileOperationException
+from app.services.delete_service import enqueue_deletions
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+async def hash_chunk(chunk: bytes) -> str:
+    """Content address of a chunk; hashed off the event loop."""
+    return await asyncio.to_thread(_sha256, chunk)
+
+# Columns describing where a blob's bytes live, shared by chunk_blobs and file_chunks
+LOCATION_COLUMNS = (
+    "discord_message_id", "shard", "attachment_index", "pack_id", "pack_offset",
+    "codec", "stored_size", "attachment_url", "url_expires_at"
+)
+
+async def find_chunk_blob(content_hash: str):
+    """Look up an already stored chunk with the same content."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text(f"SELECT {', '.join(LOCATION_COLUMNS)} FROM chunk_blobs WHERE content_hash = :content_hash"),
+            {"content_hash": content_hash}
+        )
+        return result.fetchone()
+
+def get_blob_location(blob) -> Dict[str, Any]:
+    """FileChunk column values pointing at a blob's stored bytes."""
+    return {column: getattr(blob, column) for column in LOCATION_COLUMNS}
+
+async def reference_chunk_blob(db: AsyncSession, chunk: Dict[str, Any], reused: bool) -> Tuple[Dict[str, Any], bool, List[str]]:
+    """Record one more reference to a chunk's content within the caller's transaction.
+
+    Inserts the blob or bumps its reference count atomically. If another
+    upload stored the same content first, or the blob has since moved to a
+    new pack, ``chunk`` is pointed at the blob's current location and our
+    own copy is returned as a deletion candidate.
+    Returns (chunk columns, reused, orphaned (message id, shard) pairs).
+    """
+    columns = ", ".join(LOCATION_COLUMNS)
+    values = ", ".join(f":{column}" for column in LOCATION_COLUMNS)
+    result = await db.execute(
+        text(f"""
+            INSERT INTO chunk_blobs (content_hash, size, ref_count, {columns})
+            VALUES (:content_hash, :size, 1, {values})
+            ON CONFLICT (content_hash) DO UPDATE SET ref_count = chunk_blobs.ref_count + 1
+            RETURNING ref_count, {columns}
+        """),
+        {
+            "content_hash": chunk["content_hash"],
+            "size": chunk["size"],
+            **{column: chunk.get(column) for column in LOCATION_COLUMNS},
+            "shard": chunk.get("shard", 0),
+            "attachment_index": chunk.get("attachment_index", 0)
+        }
+    )
+    blob = result.fetchone()
+    orphaned = []
+    location = get_blob_location(blob)
+    ours = (chunk["discord_message_id"], chunk.get("attachment_index", 0), chunk.get("pack_offset"))
+    if (blob.discord_message_id, blob.attachment_index, blob.pack_offset) != ours:
+        if not reused:
+            orphaned.append((chunk["discord_message_id"], chunk.get("shard", 0)))
+        chunk = {**chunk, **location}
+        reused = True
+    elif reused and blob.ref_count == 1:
+        # The blob we linked to was released while this upload was running,
+        # so its message may already be gone from Discord.
+        raise FileOperationException("Deduplicated chunk was deleted during upload, please retry")
+    return chunk, reused, orphaned
+
+async def release_chunks(db: AsyncSession, condition: str, params: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """Delete the file_chunks rows matching ``condition`` and drop their references.
+
+    Runs in the caller's transaction. Messages that are no longer
+    referenced by anything are queued in the delete outbox, so they are
+    removed from Discord once the transaction commits. A message holding
+    several attachments is only queued once none of them is in use.
+    Returns the queued (message id, shard) pairs.
+    """
+    await db.execute(
+        text(f"""
+            UPDATE chunk_blobs SET ref_count = chunk_blobs.ref_count - released.released_count
+            FROM (
+                SELECT content_hash, COUNT(*) AS released_count
+                FROM file_chunks
+                WHERE {condition} AND content_hash IS NOT NULL
+                GROUP BY content_hash
+            ) AS released
+            WHERE chunk_blobs.content_hash = released.content_hash
+        """),
+        params
+    )
+    result = await db.execute(
+        text(f"""
+            DELETE FROM chunk_blobs
+            WHERE ref_count <= 0
+              AND content_hash IN (SELECT content_hash FROM file_chunks WHERE {condition})
+            RETURNING discord_message_id, shard
+        """),
+        params
+    )
+    messages = [(row.discord_message_id, row.shard or 0) for row in result.fetchall()]
+
+    # Chunks stored before deduplication own their message outright
+    result = await db.execute(
+        text(f"DELETE FROM file_chunks WHERE {condition} RETURNING discord_message_id, shard, content_hash"),
+        params
+    )
+    messages.extend((row.discord_message_id, row.shard or 0) for row in result.fetchall() if row.content_hash is None)
+    messages = await filter_unreferenced_messages(db, messages)
+    await drop_packs(db, messages)
+    await enqueue_deletions(db, messages)
+    return messages
+
+async def filter_unreferenced_messages(db: AsyncSession, messages: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Drop (message id, shard) pairs whose message still holds content used by a blob or a file chunk."""
+    messages = list(dict.fromkeys(messages))
+    if not messages:
+        return []
+    result = await db.execute(
+        text("""
+            SELECT discord_message_id FROM chunk_blobs WHERE discord_message_id IN :ids
+            UNION
+            SELECT discord_message_id FROM file_chunks WHERE discord_message_id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)),
+        {"ids": [message_id for message_id, _ in messages]}
+    )
+    referenced = {row.discord_message_id for row in result.fetchall()}
+    return [message for message in messages if message[0] not in referenced]
+
+async def drop_packs(db: AsyncSession, messages: List[Tuple[str, int]]):
+    """Remove the pack rows of messages that are about to be deleted."""
+    if messages:
+        await db.execute(
+            text("DELETE FROM packs WHERE discord_message_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": [message_id for message_id, _ in messages]}
+        )
\ No newline at end of file
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text, bindparam
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.logger import logger
+from app.services.storage_service import get_backend
+
+# Set when deletions are queued so the worker does not wait for its next poll
+outbox_ready = asyncio.Event()
+
+async def enqueue_deletions(db: AsyncSession, messages: List[Tuple[str, int]]):
+    """Queue (message id, shard) pairs for deletion in the caller's transaction.
+
+    The rows only reach the delete worker once the transaction commits, so
+    a rolled back operation never loses messages that are still in use.
+    """
+    if not messages:
+        return
+    await db.execute(
+        text("INSERT INTO delete_outbox (discord_message_id, shard) VALUES (:discord_message_id, :shard)"),
+        [{"discord_message_id": message_id, "shard": shard} for message_id, shard in messages]
+    )
+    outbox_ready.set()
+
+async def schedule_deletions(messages: List[Tuple[str, int]]):
+    """Queue deletions outside of any other transaction."""
+    if not messages:
+        return
+    async with AsyncSessionLocal() as db:
+        await enqueue_deletions(db, messages)
+        await db.commit()
+
+async def _delete_shard_messages(message_ids: List[str], shard: int) -> List[str]:
+    """Delete objects of one shard, returning the ids that were deleted or already gone."""
+    try:
+        return await get_backend(shard).delete(message_ids)
+    except Exception as e:
+        logger.warning(f"Deleting {len(message_ids)} objects on shard {shard} failed: {str(e)}")
+        return []
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff for a deletion that has failed ``attempts`` times."""
+    seconds = settings.DELETE_RETRY_BASE * 2 ** min(attempts, 16)
+    return timedelta(seconds=min(seconds, settings.DELETE_RETRY_MAX))
+
+async def process_delete_outbox() -> int:
+    """Delete one batch of due messages from storage. Returns how many were deleted.
+
+    Rows are claimed with SKIP LOCKED by pushing their next attempt
+    DELETE_CLAIM_TIMEOUT into the future, and that transaction commits
+    before any delete call is made. Several app instances can drain the
+    outbox without deleting the same message twice, no connection or row
+    lock is held while storage is slow, and rows claimed by a worker that
+    died become due again once the claim runs out. Failed deletions are
+    retried later with exponential backoff.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("""
+                UPDATE delete_outbox SET next_attempt_at = now() + make_interval(secs => :claim_timeout)
+                WHERE id IN (
+                    SELECT id FROM delete_outbox
+                    WHERE next_attempt_at <= now()
+                    ORDER BY id
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, discord_message_id, shard, attempts
+            """),
+            {"limit": settings.DELETE_BATCH_SIZE, "claim_timeout": settings.DELETE_CLAIM_TIMEOUT}
+        )
+        rows = result.fetchall()
+        await db.commit()
+    if not rows:
+        return 0
+
+    by_shard = {}
+    for row in rows:
+        by_shard.setdefault(row.shard or 0, []).append(row.discord_message_id)
+    results = await asyncio.gather(*(
+        _delete_shard_messages(message_ids, shard) for shard, message_ids in by_shard.items()
+    ))
+    deleted = {message_id for shard_deleted in results for message_id in shard_deleted}
+
+    done = [row.id for row in rows if row.discord_message_id in deleted]
+    failed = [row for row in rows if row.discord_message_id not in deleted]
+    async with AsyncSessionLocal() as db:
+        if done:
+            await db.execute(
+                text("DELETE FROM delete_outbox WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": done}
+            )
+        if failed:
+            now = datetime.now(timezone.utc)
+            await db.execute(
+                text("UPDATE delete_outbox SET attempts = attempts + 1, next_attempt_at = :next_attempt_at WHERE id = :id"),
+                [{"id": row.id, "next_attempt_at": now + get_retry_delay(row.attempts)} for row in failed]
+            )
+            logger.warning(f"{len(failed)} message deletions failed, retrying later")
+        await db.commit()
+    return len(done)
+
+async def run_delete_worker():
+    """Background loop draining the delete outbox."""
+    while True:
+        try:
+            outbox_ready.clear()
+            deleted = await process_delete_outbox()
+            if deleted:
+                logger.info(f"Deleted {deleted} messages from Discord")
+                continue
+        except Exception as e:
+            logger.error(f"Error processing delete outbox: {str(e)}")
+        try:
+            await asyncio.wait_for(outbox_ready.wait(), timeout=settings.DELETE_WORKER_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
@@ -1,100 +1,429 @@
 import discord
 import io
 import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
 from fastapi import HTTPException
 from discord.ext import commands
+from discord.http import Route
 
 from app.core.config import settings
+from app.core.metrics import (
+    discord_request_duration, discord_rate_limited, discord_bytes,
+    discord_requests_in_flight, chunk_uploads_in_flight
+)
+from app.exceptions import DiscordBotException
 from app.logger import logger
 
+# Priority lanes, most urgent first: interactive reads, then uploads, then
+# background deletes and garbage collection
+LANES = ("read", "upload", "background")
+
+# Pacing of each kind of API request, per shard: (requests, per seconds).
+# discord.py does not expose the rate-limit headers of successful responses,
+# so buckets start from Discord's per-channel limits and are paused from the
+# headers of any 429 that gets through. CDN downloads are not rate limited.
+ROUTE_LIMITS = {
+    "send": (5, 5.0),
+    "fetch": (5, 1.0),
+    "delete": (5, 1.0),
+    "refresh": (5, 1.0),
+}
+
+class TokenBucket:
+    """Allows ``rate`` calls every ``per`` seconds, bursting up to ``rate``."""
+
+    def __init__(self, rate: int, per: float):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds until a call may start."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.fill_rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class RequestScheduler:
+    """Orders the Discord requests of one shard by lane and paces them.
+
+    Waiters are started in lane priority order as long as fewer than
+    DISCORD_MAX_CONCURRENCY requests are in flight and both the shard's
+    global bucket and the request's route bucket have a token. A waiter
+    blocked on its bucket does not hold back requests for other buckets.
+    """
+
+    def __init__(self, shard: int):
+        self.shard = shard
+        self.global_bucket = TokenBucket(settings.DISCORD_GLOBAL_RATE_LIMIT, 1.0)
+        self.buckets = {name: TokenBucket(rate, per) for name, (rate, per) in ROUTE_LIMITS.items()}
+        self.lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.stats = {lane: {"started": 0, "wait_total": 0.0, "wait_max": 0.0} for lane in LANES}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def run(
+        self,
+        lane: str,
+        bucket: Optional[str],
+        call: Callable[[], Awaitable[Any]],
+        operation: Optional[str] = None
+    ) -> Any:
+        """Run ``call()`` once the scheduler grants it a slot.
+
+        ``bucket`` names a ROUTE_LIMITS entry, or None for requests that are
+        only bounded by concurrency. Rate-limited calls are retried up to
+        DISCORD_RATE_LIMIT_RETRIES times, so ``call`` must be repeatable.
+        ``operation`` labels the call in metrics and defaults to the bucket.
+        """
+        operation = operation or bucket
+        shard = str(self.shard)
+        for attempt in range(settings.DISCORD_RATE_LIMIT_RETRIES + 1):
+            await self._acquire(lane, bucket)
+            start = time.perf_counter()
+            try:
+                return await call()
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    discord_rate_limited.inc(operation, shard)
+                if e.status != 429 or attempt == settings.DISCORD_RATE_LIMIT_RETRIES:
+                    raise
+                self._pause(bucket, e)
+            finally:
+                discord_request_duration.observe(time.perf_counter() - start, operation, shard)
+                self._release()
+
+    async def _acquire(self, lane: str, bucket: Optional[str]):
+        waiter = (bucket, asyncio.get_running_loop().create_future(), time.monotonic())
+        self.lanes[lane].append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter in self.lanes[lane]:
+                self.lanes[lane].remove(waiter)
+            elif not waiter[1].cancelled():
+                # Granted just before the cancellation arrived
+                self._release()
+            raise
+        wait = time.monotonic() - waiter[2]
+        stats = self.stats[lane]
+        stats["started"] += 1
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wakeup.set()
+
+    def _pause(self, bucket: Optional[str], error: discord.HTTPException):
+        headers = error.response.headers if error.response is not None else {}
+        retry_after = float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1)
+        target = self.global_bucket if headers.get("X-RateLimit-Global") or not bucket else self.buckets[bucket]
+        target.pause(retry_after)
+        self.rate_limited += 1
+        logger.warning(f"Shard {self.shard} rate limited on {bucket or 'global'}, pausing {retry_after:.2f}s")
+
+    def _grant(self) -> Optional[float]:
+        """Start every waiter that may run now; returns seconds until the next one could."""
+        now = time.monotonic()
+        next_delay = None
+        blocked = set()
+        for lane in LANES:
+            queue = self.lanes[lane]
+            for waiter in list(queue):
+                if self.in_flight >= settings.DISCORD_MAX_CONCURRENCY:
+                    return None
+                bucket, future, _ = waiter
+                if future.done():
+                    queue.remove(waiter)
+                    continue
+                if bucket in blocked:
+                    continue
+                delay = 0.0
+                if bucket is not None:
+                    delay = max(self.global_bucket.delay(now), self.buckets[bucket].delay(now))
+                if delay > 0:
+                    blocked.add(bucket)
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                    continue
+                if bucket is not None:
+                    self.global_bucket.take()
+                    self.buckets[bucket].take()
+                queue.remove(waiter)
+                self.in_flight += 1
+                future.set_result(None)
+        return next_delay
+
+    async def _dispatch(self):
+        while any(self.lanes.values()):
+            self._wakeup.clear()
+            delay = self._grant()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and time spent waiting per lane."""
+        now = time.monotonic()
+        lanes = {}
+        for lane in LANES:
+            stats = self.stats[lane]
+            queued = [waiter for waiter in self.lanes[lane] if not waiter[1].done()]
+            lanes[lane] = {
+                "queued": len(queued),
+                "oldest_wait": round(max((now - waiter[2] for waiter in queued), default=0.0), 4),
+                "started": stats["started"],
+                "avg_wait": round(stats["wait_total"] / stats["started"], 4) if stats["started"] else 0.0,
+                "max_wait": round(stats["wait_max"], 4)
+            }
+        return {
+            "shard": self.shard,
+            "in_flight": self.in_flight,
+            "rate_limited": self.rate_limited,
+            "lanes": lanes
+        }
+
 class StorageBot(commands.Bot):
-    def __init__(self):
+    def __init__(self, shard: int = 0, channel_id: int = settings.CHANNEL_ID):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.guilds = True
         super().__init__(command_prefix="!", intents=intents)
+        self.shard = shard
+        self.channel_id = channel_id
         self.channel = None
         self.ready = asyncio.Event()
+        self.uploads_in_flight = 0  # Used by the least_loaded placement policy
+        self.scheduler = RequestScheduler(shard)
         
     async def setup_hook(self):
-        logger.info(f"Bot is ready! Logged in as {self.user}")
+        logger.info(f"Bot for shard {self.shard} is ready! Logged in as {self.user}")
         await self.ensure_channel()
         
     async def ensure_channel(self):
         try:
-            self.channel = self.get_channel(settings.CHANNEL_ID)
+            self.channel = self.get_channel(self.channel_id)
             if not self.channel:
                 for guild in self.guilds:
-                    self.channel = guild.get_channel(settings.CHANNEL_ID)
+                    self.channel = guild.get_channel(self.channel_id)
                     if self.channel:
                         break
                 if not self.channel:
-                    self.channel = await self.fetch_channel(settings.CHANNEL_ID)
+                    self.channel = await self.fetch_channel(self.channel_id)
             if self.channel:
-                logger.info(f"Successfully connected to channel: {self.channel.name}")
+                logger.info(f"Shard {self.shard} connected to channel: {self.channel.name}")
                 self.ready.set()
             else:
-                logger.error(f"Could not find channel with ID: {settings.CHANNEL_ID}")
+                logger.error(f"Could not find channel with ID: {self.channel_id}")
         except Exception as e:
             logger.error(f"Error connecting to channel: {str(e)}")
 
-    async def upload_chunk(self, chunk: bytes, filename: str, chunk_id: int) -> str:
+    async def upload_chunk(self, chunk: bytes, filename: str, chunk_id: int) -> discord.Message:
+        return await self.upload_chunks([(chunk, f"{filename}.part{chunk_id}")], f"Chunk {chunk_id} of {filename}")
+
+    async def upload_chunks(self, parts: List[Tuple[bytes, str]], content: str) -> discord.Message:
         await self.ensure_channel()
-        file = discord.File(fp=io.BytesIO(chunk), filename=f"{filename}.part{chunk_id}")
-        message = await self.channel.send(content=f"Chunk {chunk_id} of {filename}", file=file)
-        return str(message.id)
-
-# Create a single instance of the bot
-bot = StorageBot()
-
-async def ensure_bot_ready():
-    """Ensure the bot is ready and connected to the channel."""
-    if not bot.is_ready():
-        await bot.wait_until_ready()
-    if not bot.channel:
-        await bot.ensure_channel()
-    if not bot.channel:
+
+        async def send() -> discord.Message:
+            # Fresh file objects for every attempt, a retry must not resend consumed buffers
+            files = [discord.File(fp=io.BytesIO(data), filename=name) for data, name in parts]
+            return await self.channel.send(content=content, files=files)
+
+        self.uploads_in_flight += 1
+        try:
+            message = await self.scheduler.run("upload", "send", send)
+        finally:
+            self.uploads_in_flight -= 1
+        discord_bytes.inc("sent", amount=sum(len(data) for data, _ in parts))
+        return message
+
+# STORAGE_SHARDS entries with one of these prefixes are not Discord
+# channels; storage_service builds their backends
+OTHER_BACKEND_SCHEMES = ("local:", "s3:")
+
+def get_shard_config() -> List[Tuple[int, str, int]]:
+    """Parse the Discord entries of STORAGE_SHARDS into (shard, token, channel id).
+
+    Falls back to the single DISCORD_TOKEN / CHANNEL_ID pair when unset.
+    """
+    if not settings.STORAGE_SHARDS.strip():
+        return [(0, settings.DISCORD_TOKEN, settings.CHANNEL_ID)]
+    shards = []
+    for shard, entry in enumerate(settings.STORAGE_SHARDS.split(",")):
+        entry = entry.strip()
+        if entry.startswith(OTHER_BACKEND_SCHEMES):
+            continue
+        token, _, channel_id = entry.rpartition(":")
+        if not token or not channel_id.isdigit():
+            raise ValueError(f"Invalid STORAGE_SHARDS entry, expected token:channel_id: {entry[-24:]}")
+        shards.append((shard, token, int(channel_id)))
+    return shards
+
+# One bot per (token, channel) pair. The shard number is the position in
+# STORAGE_SHARDS and is stored with every chunk, so only append new shards.
+SHARDS = get_shard_config()
+bots = [StorageBot(shard, channel_id) for shard, _, channel_id in SHARDS]
+bot = bots[0] if bots else None
+_bots_by_shard = {shard_bot.shard: shard_bot for shard_bot in bots}
+
+# Read at scrape time, so the hot path only keeps its existing counters
+discord_requests_in_flight.set_function(lambda: [((str(b.shard),), b.scheduler.in_flight) for b in bots])
+chunk_uploads_in_flight.set_function(lambda: [((str(b.shard),), b.uploads_in_flight) for b in bots])
+
+def get_bot(shard: Optional[int]) -> StorageBot:
+    """Bot of the shard a chunk was stored on; chunks from before sharding are on shard 0."""
+    target = _bots_by_shard.get(shard or 0)
+    if target is None:
+        raise DiscordBotException(f"Storage shard {shard or 0} is not a configured Discord channel")
+    return target
+
+async def ensure_bot_ready(shard: Optional[int] = None):
+    """Ensure a shard's bot, by default the first one, is ready and connected to its channel."""
+    if shard is None and bot is None:
+        raise DiscordBotException("No Discord storage shard is configured")
+    target = bot if shard is None else get_bot(shard)
+    if not target.is_ready():
+        await target.wait_until_ready()
+    if not target.channel:
+        await target.ensure_channel()
+    if not target.channel:
         raise HTTPException(
             status_code=500,
-            detail=f"Could not connect to Discord channel {settings.CHANNEL_ID}."
+            detail=f"Could not connect to Discord channel {target.channel_id}."
         )
-    return bot.channel
+    return target.channel
+
+# Discord accepts at most this many URLs per refresh-urls call
+ATTACHMENT_REFRESH_BATCH = 50
 
-async def upload_file_chunk(chunk: bytes, filename: str, chunk_id: int):
-    """Upload a file chunk to Discord."""
-    return await bot.upload_chunk(chunk, filename, chunk_id)
+# Discord bulk deletes at most 100 messages at a time, none older than 14
+# days; the margin covers requests that wait in the scheduler
+BULK_DELETE_BATCH = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(hours=1)
+
+def get_attachment_expiry(url: str) -> Optional[datetime]:
+    """Read the expiry time Discord encodes in the ``ex`` parameter of CDN URLs."""
+    expiry = parse_qs(urlparse(url).query).get("ex")
+    if not expiry:
+        return None
+    try:
+        return datetime.fromtimestamp(int(expiry[0], 16), tz=timezone.utc)
+    except ValueError:
+        return None
+
+async def download_attachment(url: str, shard: int = 0, lane: str = "read") -> bytes:
+    """Download an attachment straight from the Discord CDN."""
+    target = get_bot(shard)
+    data = await target.scheduler.run(lane, None, lambda: target.http.get_from_cdn(url), "attachment_read")
+    discord_bytes.inc("received", amount=len(data))
+    return data
+
+async def refresh_attachment_urls(urls: List[str], shard: int = 0) -> Dict[str, str]:
+    """Exchange expired CDN URLs for fresh ones, in batches.
+
+    Returns a mapping of original URL to refreshed URL.
+    """
+    refreshed = {}
+    for start in range(0, len(urls), ATTACHMENT_REFRESH_BATCH):
+        batch = urls[start:start + ATTACHMENT_REFRESH_BATCH]
+        target = get_bot(shard)
+        data = await target.scheduler.run("read", "refresh", lambda: target.http.request(
+            Route("POST", "/attachments/refresh-urls"),
+            json={"attachment_urls": batch}
+        ), "refresh_urls")
+        for entry in data.get("refreshed_urls", []):
+            refreshed[entry["original"]] = entry["refreshed"]
+    return refreshed
 
 async def get_bot_status():
     """Get the status of the Discord bot."""
-    channel = await ensure_bot_ready()
+    channel = await ensure_bot_ready() if bot else None
     return {
-        "bot_ready": bot.is_ready(),
+        "bot_ready": bool(bot and bot.is_ready()),
         "channel_connected": bool(channel),
         "channel_id": channel.id if channel else None,
-        "channel_name": channel.name if channel else None
+        "channel_name": channel.name if channel else None,
+        "placement": settings.SHARD_PLACEMENT,
+        "shards": [
+            {
+                "shard": shard_bot.shard,
+                "bot_ready": shard_bot.is_ready(),
+                "channel_id": shard_bot.channel_id,
+                "channel_connected": bool(shard_bot.channel),
+                "uploads_in_flight": shard_bot.uploads_in_flight
+            }
+            for shard_bot in bots
+        ]
     }
 
-async def fetch_message(message_id: str):
+async def fetch_message(message_id: str, shard: int = 0, lane: str = "read"):
     """Fetch a message from Discord by its ID."""
-    await ensure_bot_ready()
-    return await bot.channel.fetch_message(message_id)
+    channel = await ensure_bot_ready(shard)
+    return await get_bot(shard).scheduler.run(lane, "fetch", lambda: channel.fetch_message(message_id), "fetch_message")
 
-async def delete_message(message_id: str):
+async def delete_message(message_id: str, shard: int = 0):
     """Delete a message from Discord."""
-    await ensure_bot_ready()
+    channel = await ensure_bot_ready(shard)
     try:
-        message = await bot.channel.fetch_message(message_id)
-        await message.delete()
+        # A partial message deletes without fetching it first
+        message = channel.get_partial_message(int(message_id))
+        await get_bot(shard).scheduler.run("background", "delete", message.delete)
+        return True
+    except discord.NotFound:
         return True
     except Exception as e:
         logger.error(f"Error deleting message {message_id}: {e}")
         return False
 
-async def start_bot(token: str):
-    """Start the Discord bot."""
-    asyncio.create_task(bot.start(token))
+def can_bulk_delete(message_id: str) -> bool:
+    """Whether a message is young enough for Discord's bulk delete endpoint."""
+    age = datetime.now(timezone.utc) - discord.utils.snowflake_time(int(message_id))
+    return age < BULK_DELETE_MAX_AGE
+
+async def bulk_delete_messages(message_ids: List[str], shard: int = 0):
+    """Delete up to BULK_DELETE_BATCH recent messages of one shard in a single request."""
+    channel = await ensure_bot_ready(shard)
+    messages = [discord.Object(id=int(message_id)) for message_id in message_ids]
+    await get_bot(shard).scheduler.run("background", "delete", lambda: channel.delete_messages(messages), "bulk_delete")
+
+async def delete_messages(messages: List[Tuple[str, int]]):
+    """Delete several (message id, shard) messages from Discord, skipping any that fail."""
+    for message_id, shard in messages:
+        await delete_message(message_id, shard)
+
+async def get_scheduler_stats():
+    """Get queue depth and wait times of the request scheduler of every shard."""
+    return {"shards": [shard_bot.scheduler.get_stats() for shard_bot in bots]}
+
+async def start_bot():
+    """Start the Discord bot of every storage shard."""
+    for shard_bot, (_, token, _) in zip(bots, SHARDS):
+        asyncio.create_task(shard_bot.start(token))
     
 async def close_bot():
-    """Close the Discord bot connection."""
-    if bot.is_ready():
-        await bot.close()
\ No newline at end of file
+    """Close the Discord bot connections."""
+    for shard_bot in bots:
+        if shard_bot.is_ready():
+            await shard_bot.close()
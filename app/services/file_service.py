@@ -1,17 +1,37 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
-from fastapi.responses import StreamingResponse, JSONResponse
-from typing import List, Dict, Any, Tuple
-from fastapi import status
+from sqlalchemy import text, select, bindparam
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from typing import List, Dict, Any, Tuple, Callable, Awaitable, Optional
+from fastapi import status, UploadFile
+import asyncio
+from collections import deque
+from contextlib import aclosing
+from functools import partial
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
 
-from app.exceptions import NotFoundException, DatabaseException, FileOperationException
+from app.exceptions import NotFoundException, DatabaseException, FileOperationException, ValidationException
 from app.utils.constants import FILE_NOT_FOUND, INVALID_FILE_TYPE, FILE_TYPE_NOT_SUPPORTED
-from app.models import FileChunk
+from app.models import File, FileChunk, Folder
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.logger import logger
+from app.utils.pagination import keyset_query, paginate_rows
 import mimetypes
 import os
 
-# This will be replaced with the modularized Discord bot in discord_service.py
-from app.services.discord_service import bot, ensure_bot_ready
+from app.services.discord_service import get_attachment_expiry
+from app.services.storage_service import get_backend, upload_file_chunk, upload_chunk_batch
+from app.services.dedup_service import (
+    hash_chunk, find_chunk_blob, get_blob_location, reference_chunk_blob,
+    release_chunks, filter_unreferenced_messages, drop_packs
+)
+from app.services.naming_service import insert_with_unique_name
+from app.services.pack_service import PackBuilder, add_packs
+from app.services.delete_service import enqueue_deletions, schedule_deletions
+from app.services.cache_service import chunk_cache
+from app.services.compression_service import compress_chunk, decompress_chunk
 
 # Enhanced list of viewable MIME type categories
 VIEWABLE_MIME_TYPES = [
@@ -41,8 +61,25 @@ EXTENSION_MIME_MAP = {
     '.json': 'application/json',
 }
 
-async def list_files(db: AsyncSession, folder_id: int, user_id: int):
-    """List all files in a folder belonging to a user."""
+# Public sort names of file listings and the files columns behind them
+FILE_SORTS = {"name": "name", "size": "size", "date": "created_at"}
+
+async def list_files(
+    db: AsyncSession,
+    folder_id: int,
+    user_id: int,
+    sort: str = "name",
+    order: str = "asc",
+    limit: int = settings.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    with_total: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+    """List one page of the files in a folder belonging to a user.
+
+    Pages are read by keyset, so each one costs the same however deep into
+    the folder it is. Returns (files, next cursor or None, total or None);
+    the total is only counted when ``with_total`` is set.
+    """
     try:
         # Verify folder belongs to current user
         result = await db.execute(
@@ -53,33 +90,35 @@ async def list_files(db: AsyncSession, folder_id: int, user_id: int):
         if not folder:
             raise NotFoundException(f"Folder with id {folder_id} not found or does not belong to you")
             
+        where, order_by, params = keyset_query(FILE_SORTS, sort, order, cursor)
         result = await db.execute(
-            text("SELECT DISTINCT file_name FROM file_chunks WHERE folder_id = :folder_id"),
-            {"folder_id": folder_id}
+            text(f"""
+                SELECT id, name, size, chunk_count, mime_type, category, created_at
+                FROM files WHERE folder_id = :folder_id {where}
+                {order_by}
+                LIMIT :limit
+            """),
+            {"folder_id": folder_id, "limit": limit + 1, **params}
         )
-        files = result.fetchall()
+        files, next_cursor = paginate_rows(result.fetchall(), limit, FILE_SORTS, sort, order)
         
-        # Enhanced file list with more info
-        file_list = []
-        for f in files:
-            name = f[0]
-            mime_type = get_mime_type(name)
-            is_viewable = is_file_viewable(mime_type)
-            file_list.append({
-                "name": name,
-                "mime_type": mime_type,
-                "viewable": is_viewable,
-                "type": get_file_type_category(mime_type)
-            })
+        total = None
+        if with_total:
+            result = await db.execute(
+                text("SELECT COUNT(*) FROM files WHERE folder_id = :folder_id"),
+                {"folder_id": folder_id}
+            )
+            total = result.scalar()
         
-        return file_list
-    except NotFoundException as e:
+        # Enhanced file list with more info
+        return [get_file_info(f) for f in files], next_cursor, total
+    except (NotFoundException, ValidationException) as e:
         raise e
     except Exception as e:
         raise DatabaseException(f"Error listing files: {str(e)}")
 
 async def delete_file(db: AsyncSession, file_name: str, folder_id: int, user_id: int):
-    """Delete a file and all its chunks from Discord."""
+    """Delete a file; its chunks are removed from Discord in the background."""
     try:
         # Verify folder belongs to current user
         result = await db.execute(
@@ -91,30 +130,18 @@ async def delete_file(db: AsyncSession, file_name: str, folder_id: int, user_id:
             raise NotFoundException(f"Folder with id {folder_id} not found or does not belong to you")
             
         result = await db.execute(
-            text("SELECT discord_message_id FROM file_chunks WHERE file_name = :file_name AND folder_id = :folder_id"),
+            text("SELECT id FROM files WHERE name = :file_name AND folder_id = :folder_id"),
             {"file_name": file_name, "folder_id": folder_id}
         )
-        file_chunks = result.fetchall()
-        
-        if not file_chunks:
+        file = result.fetchone()
+        if not file:
             raise NotFoundException(f"File {file_name} not found in folder {folder_id}")
             
-        await db.execute(
-            text("DELETE FROM file_chunks WHERE file_name = :file_name AND folder_id = :folder_id"),
-            {"file_name": file_name, "folder_id": folder_id}
-        )
+        # Messages no other file references are queued for the background delete worker
+        await release_chunks(db, "file_id = :file_id", {"file_id": file.id})
+        await db.execute(text("DELETE FROM files WHERE id = :id"), {"id": file.id})
         await db.commit()
         
-        channel = await ensure_bot_ready()
-        if channel:
-            for chunk in file_chunks:
-                try:
-                    message = await channel.fetch_message(chunk.discord_message_id)
-                    await message.delete()
-                except Exception:
-                    # Log error but continue with deletion
-                    pass
-        
         return file_name
     except NotFoundException as e:
         raise e
@@ -122,8 +149,357 @@ async def delete_file(db: AsyncSession, file_name: str, folder_id: int, user_id:
         await db.rollback()
         raise FileOperationException(f"Error deleting file: {str(e)}")
 
-async def get_file_chunks(db: AsyncSession, filename: str, folder_id: int, user_id: int):
-    """Get all chunks for a file."""
+async def prepare_chunk(chunk: bytes, mime_type: str) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Hash a chunk and either link it to stored content or compress it for upload.
+
+    Returns the FileChunk column values known so far and the payload to
+    upload, which is None when the same content is already on Discord.
+    """
+    content_hash = await hash_chunk(chunk)
+    columns = {"size": len(chunk), "content_hash": content_hash}
+    blob = await find_chunk_blob(content_hash)
+    if blob:
+        columns.update(get_blob_location(blob), reused=True)
+        return columns, None
+    payload, codec = await compress_chunk(chunk, mime_type)
+    columns.update(codec=codec, stored_size=len(payload))
+    return columns, payload
+
+async def upload_file_chunks(
+    read: Callable[[int], Awaitable[bytes]],
+    filename: str,
+    uploaded: Dict[int, Dict[str, Any]],
+    release: Optional[Callable[[Any], Awaitable[None]]] = None
+) -> Tuple[int, int]:
+    """Upload a file to storage keeping up to UPLOAD_CONCURRENCY chunks in flight.
+
+    A window slot is taken before each chunk is read, so at most
+    UPLOAD_CONCURRENCY chunks are held in memory at once. Chunks whose
+    content is already stored are linked instead of uploaded again, and new
+    ones are compressed when COMPRESSION_ENABLED and it pays off.
+    Completed chunks are recorded in ``uploaded`` (chunk_id -> FileChunk
+    column values) as they finish so the caller can clean up after a
+    failure. ``release`` is awaited with each chunk once it is no longer
+    needed, e.g. to recycle pooled buffers. Returns (chunk_count, total_size).
+    """
+    window = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+    tasks: List[asyncio.Task] = []
+    held: Dict[int, Any] = {}  # Chunks not yet handed back to ``release``
+    mime_type = get_mime_type(filename)
+
+    async def send(chunk: bytes, chunk_id: int):
+        try:
+            columns, payload = await prepare_chunk(chunk, mime_type)
+            if payload is not None:
+                columns.update(await upload_file_chunk(payload, filename, chunk_id, columns["content_hash"]))
+            uploaded[chunk_id] = columns
+        finally:
+            if held.pop(chunk_id, None) is not None:
+                await release(chunk)
+            window.release()
+
+    chunk_id = 0
+    total_size = 0
+    try:
+        while True:
+            await window.acquire()
+            # Stop reading as soon as an in-flight chunk has failed
+            failed = next((t for t in tasks if t.done() and t.exception()), None)
+            if failed:
+                window.release()
+                raise failed.exception()
+
+            chunk = await read(settings.CHUNK_SIZE)
+            if not chunk:
+                window.release()
+                break
+            chunk_id += 1
+            total_size += len(chunk)
+            if release is not None:
+                held[chunk_id] = chunk
+            tasks.append(asyncio.create_task(send(chunk, chunk_id)))
+
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Tasks cancelled before they started never reached their own release
+        for chunk in held.values():
+            await release(chunk)
+        raise
+
+    return chunk_id, total_size
+
+class AttachmentBatch:
+    """Packs small chunks into shared multi-attachment messages.
+
+    Chunks are buffered until the next one would exceed
+    DISCORD_MAX_ATTACHMENTS or DISCORD_MAX_MESSAGE_BYTES, then sent as one
+    message in the background with up to UPLOAD_CONCURRENCY messages in
+    flight. The column dicts passed to add() are filled in once sent.
+    """
+
+    def __init__(self):
+        self.parts: List[Tuple[bytes, str, Dict[str, Any]]] = []
+        self.size = 0
+        self.window = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+        self.tasks: List[asyncio.Task] = []
+
+    def fits(self, payload: bytes) -> bool:
+        return (
+            len(self.parts) < settings.DISCORD_MAX_ATTACHMENTS
+            and self.size + len(payload) <= settings.DISCORD_MAX_MESSAGE_BYTES
+        )
+
+    async def add(self, payload: bytes, label: str, columns: Dict[str, Any]):
+        if not self.fits(payload):
+            await self.flush()
+        self.parts.append((payload, label, columns))
+        self.size += len(payload)
+
+    async def flush(self):
+        if not self.parts:
+            return
+        parts, self.parts, self.size = self.parts, [], 0
+        await self.window.acquire()
+        failed = next((t for t in self.tasks if t.done() and t.exception()), None)
+        if failed:
+            self.window.release()
+            raise failed.exception()
+        self.tasks.append(asyncio.create_task(self._send(parts)))
+
+    async def _send(self, parts: List[Tuple[bytes, str, Dict[str, Any]]]):
+        try:
+            stored = await upload_chunk_batch([(payload, label) for payload, label, _ in parts])
+            for (_, _, columns), location in zip(parts, stored):
+                columns.update(location)
+        finally:
+            self.window.release()
+
+    async def close(self):
+        """Send whatever is buffered and wait for every message to be stored."""
+        await self.flush()
+        await asyncio.gather(*self.tasks)
+
+    async def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+async def upload_file_batch(
+    db: AsyncSession,
+    files: List[UploadFile],
+    folder_id: int,
+    uploads: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Upload several files, packing the ones that fit in one chunk into shared storage.
+
+    Files up to PACK_THRESHOLD are appended into pack blobs, other
+    single-chunk files share multi-attachment messages and larger files go
+    through upload_file_chunks. Each file is appended to ``uploads`` as
+    {"name", "chunk_count", "size", "uploaded"} before its data is sent, so
+    the caller can clean up after a failure. Returns the packs to record.
+    """
+    batch = AttachmentBatch()
+    packer = PackBuilder()
+    try:
+        for file in files:
+            # The final name is allocated when the batch is saved
+            name = file.filename
+            entry = {"name": name, "chunk_count": 0, "size": 0, "uploaded": {}}
+            uploads.append(entry)
+
+            first = await file.read(settings.CHUNK_SIZE)
+            if len(first) < settings.CHUNK_SIZE:
+                # The whole file is a single chunk: share a message with others
+                entry.update(chunk_count=1 if first else 0, size=len(first))
+                if first:
+                    columns, payload = await prepare_chunk(first, get_mime_type(name))
+                    entry["uploaded"][1] = columns
+                    if payload is not None and len(first) <= settings.PACK_THRESHOLD:
+                        await packer.add(payload, columns)
+                    elif payload is not None:
+                        await batch.add(payload, f"{name}.part1", columns)
+                continue
+
+            remaining = [first]
+            async def read(size: int, remaining=remaining, file=file) -> bytes:
+                return remaining.pop() if remaining else await file.read(size)
+
+            chunk_count, size = await upload_file_chunks(read, name, entry["uploaded"])
+            entry.update(chunk_count=chunk_count, size=size)
+        await batch.close()
+        return await packer.close()
+    except BaseException:
+        await batch.cancel()
+        await packer.cancel()
+        raise
+
+async def backfill_files(db: AsyncSession) -> int:
+    """Create the files rows of files uploaded before the files table existed.
+
+    Such files only have file_chunks rows. Each distinct (folder_id,
+    file_name) among chunks with no file_id becomes a file, with size and
+    chunk count summed from its chunks; chunks stored before sizes were
+    recorded count as zero bytes. Chunks of resumable uploads are left
+    alone. Safe to run on every startup. Returns the number of files created.
+    """
+    result = await db.execute(
+        text("""
+            INSERT INTO files (name, folder_id, size, chunk_count, created_at)
+            SELECT file_name, folder_id, COALESCE(SUM(size), 0), COUNT(*), now()
+            FROM file_chunks
+            WHERE file_id IS NULL AND upload_session_id IS NULL
+              AND file_name IS NOT NULL AND folder_id IS NOT NULL
+            GROUP BY folder_id, file_name
+            ON CONFLICT (folder_id, name) DO NOTHING
+            RETURNING id, name
+        """)
+    )
+    created = result.fetchall()
+    if not created:
+        return 0
+    await db.execute(
+        text("""
+            UPDATE file_chunks SET file_id = files.id
+            FROM files
+            WHERE file_chunks.file_id IS NULL AND file_chunks.upload_session_id IS NULL
+              AND files.folder_id = file_chunks.folder_id AND files.name = file_chunks.file_name
+              AND files.id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)),
+        {"ids": [file.id for file in created]}
+    )
+    for file in created:
+        mime_type = get_mime_type(file.name)
+        await db.execute(
+            text("UPDATE files SET mime_type = :mime_type, category = :category WHERE id = :id"),
+            {"id": file.id, "mime_type": mime_type, "category": get_file_type_category(mime_type)}
+        )
+    await db.commit()
+    return len(created)
+
+async def add_file(db: AsyncSession, filename: str, folder_id: int, size: int, chunk_count: int) -> File:
+    """Insert a files row under the first free name, without committing."""
+    mime_type = get_mime_type(filename)
+    
+    async def insert(name: str) -> File:
+        file = File(
+            name=name,
+            folder_id=folder_id,
+            size=size,
+            chunk_count=chunk_count,
+            mime_type=mime_type,
+            category=get_file_type_category(mime_type),
+            created_at=datetime.now(timezone.utc)
+        )
+        db.add(file)
+        await db.flush()
+        return file
+    
+    return await insert_with_unique_name(db, "file", folder_id, filename, insert)
+
+async def add_file_chunks(
+    db: AsyncSession,
+    filename: str,
+    folder_id: int,
+    chunk_count: int,
+    size: int,
+    uploaded: Dict[int, Dict[str, Any]]
+) -> Tuple[File, Dict[str, Any], List[Tuple[str, int]]]:
+    """Add a file and its uploaded chunks to the session without committing.
+
+    The file gets ``filename``, or a suffixed variant if the folder already
+    has a file by that name. Each chunk takes a reference on its content
+    blob. Returns the file, the deduplication stats and the (message id,
+    shard) pairs of copies that lost a race with a concurrent upload of the
+    same content.
+    """
+    file = await add_file(db, filename, folder_id, size, chunk_count)
+    filename = file.name
+    
+    orphaned = []
+    reused_chunks = 0
+    reused_bytes = 0
+    for chunk_id in range(1, chunk_count + 1):
+        columns = dict(uploaded[chunk_id])
+        reused = columns.pop("reused", False)
+        columns, reused, duplicates = await reference_chunk_blob(db, columns, reused)
+        orphaned.extend(duplicates)
+        if reused:
+            reused_chunks += 1
+            reused_bytes += columns["size"]
+        db.add(FileChunk(file_id=file.id, file_name=filename, chunk_id=chunk_id, folder_id=folder_id, **columns))
+    
+    stats = {
+        "chunks_reused": reused_chunks,
+        "bytes_reused": reused_bytes,
+        "hit_rate": round(reused_chunks / chunk_count, 4) if chunk_count else 0.0
+    }
+    return file, stats, orphaned
+
+async def _commit_uploads(db: AsyncSession, uploads: List[Dict[int, Dict[str, Any]]], orphaned: List[Tuple[str, int]]):
+    await db.commit()
+    # The messages now belong to the files, so a later failure must not discard them
+    for uploaded in uploads:
+        uploaded.clear()
+    
+    # Orphaned copies may share a message with chunks that were kept
+    messages = await filter_unreferenced_messages(db, orphaned)
+    await drop_packs(db, messages)
+    await enqueue_deletions(db, messages)
+    await db.commit()
+
+async def save_file_chunks(
+    db: AsyncSession,
+    filename: str,
+    folder_id: int,
+    chunk_count: int,
+    size: int,
+    uploaded: Dict[int, Dict[str, Any]]
+) -> Tuple[File, Dict[str, Any]]:
+    """Persist an uploaded file and its chunks in chunk_id order and commit.
+
+    Returns the file and the deduplication stats for the upload.
+    """
+    file, stats, orphaned = await add_file_chunks(db, filename, folder_id, chunk_count, size, uploaded)
+    await _commit_uploads(db, [uploaded], orphaned)
+    return file, stats
+
+async def save_file_batch(
+    db: AsyncSession,
+    folder_id: int,
+    uploads: List[Dict[str, Any]],
+    packs: List[Dict[str, Any]]
+) -> List[Tuple[File, Dict[str, Any]]]:
+    """Persist every file and pack of a batch upload in one transaction.
+
+    Returns each file with its deduplication stats, in upload order.
+    """
+    await add_packs(db, packs)
+    saved = []
+    orphaned = []
+    for entry in uploads:
+        file, stats, duplicates = await add_file_chunks(
+            db, entry["name"], folder_id, entry["chunk_count"], entry["size"], entry["uploaded"]
+        )
+        saved.append((file, stats))
+        orphaned.extend(duplicates)
+    await _commit_uploads(db, [entry["uploaded"] for entry in uploads], orphaned)
+    return saved
+
+async def discard_uploaded_chunks(*uploads: Dict[int, Dict[str, Any]]):
+    """Queue the messages of a failed upload for deletion, leaving linked shared content alone."""
+    messages = {
+        (chunk["discord_message_id"], chunk.get("shard", 0))
+        for uploaded in uploads
+        for chunk in uploaded.values()
+        if chunk.get("discord_message_id") and not chunk.get("reused")
+    }
+    await schedule_deletions(list(messages))
+
+async def get_file(db: AsyncSession, filename: str, folder_id: int, user_id: int) -> File:
+    """Get a file by name from a folder belonging to a user."""
     # Verify folder belongs to current user
     result = await db.execute(
         text("SELECT id FROM folders WHERE id = :folder_id AND user_id = :user_id"),
@@ -134,15 +510,36 @@ async def get_file_chunks(db: AsyncSession, filename: str, folder_id: int, user_
         raise NotFoundException(f"Folder with id {folder_id} not found or does not belong to you")
     
     result = await db.execute(
-        text("SELECT chunk_id, discord_message_id FROM file_chunks WHERE file_name = :filename AND folder_id = :folder_id ORDER BY chunk_id"),
-        {"filename": filename, "folder_id": folder_id}
+        select(File).where(File.folder_id == folder_id, File.name == filename)
     )
-    chunks = result.fetchall()
-    
-    if not chunks:
+    file = result.scalar_one_or_none()
+    if not file:
         raise NotFoundException(f"File {filename} not found in folder {folder_id}")
-    
-    return chunks
+    return file
+
+async def get_file_by_id(db: AsyncSession, file_id: int, user_id: int) -> File:
+    """Get a file by id, checking that it belongs to the user."""
+    result = await db.execute(
+        select(File, Folder.user_id).join(Folder, File.folder_id == Folder.id).where(File.id == file_id)
+    )
+    row = result.first()
+    if not row:
+        raise NotFoundException(f"File with id {file_id} not found")
+    if row.user_id != user_id:
+        raise FileOperationException("You don't have permission to access this file")
+    return row.File
+
+async def list_file_chunks(db: AsyncSession, file_id: int):
+    """Get the chunks of a file in order."""
+    result = await db.execute(
+        select(FileChunk).where(FileChunk.file_id == file_id).order_by(FileChunk.chunk_id)
+    )
+    return result.scalars().all()
+
+async def get_file_chunks(db: AsyncSession, filename: str, folder_id: int, user_id: int):
+    """Get all chunks for a file."""
+    file = await get_file(db, filename, folder_id, user_id)
+    return await list_file_chunks(db, file.id)
 
 def get_mime_type(filename: str) -> str:
     """Get the MIME type of a file with enhanced detection."""
@@ -179,44 +576,376 @@ def get_file_type_category(mime_type: str) -> str:
     else:
         return "other"
 
-async def create_file_download_stream(filename: str, chunks):
-    """Create a streaming response for file download."""
-    async def file_generator():
-        for chunk_id, discord_message_id in chunks:
+def get_chunk_cache_key(chunk) -> str:
+    """Cache key of a chunk's stored bytes: its message, plus the attachment if not the first."""
+    if chunk.attachment_index:
+        return f"{chunk.discord_message_id}-{chunk.attachment_index}"
+    return chunk.discord_message_id
+
+async def read_chunk(chunk, messages: Optional[Dict[str, asyncio.Task]] = None) -> bytes:
+    """Get the original bytes of a stored chunk, from the local cache when possible."""
+    key = get_chunk_cache_key(chunk)
+    backend = get_backend(chunk.shard)
+    if chunk.pack_id is not None and backend.supports_range and not chunk_cache.contains(key):
+        # Backends with ranged reads fetch just this member instead of the whole pack
+        data = await backend.get_range(
+            chunk.discord_message_id, chunk.attachment_index or 0,
+            chunk.pack_offset, chunk.pack_offset + chunk.stored_size
+        )
+        return await decompress_chunk(data, chunk.codec)
+    data = await chunk_cache.get(key)
+    if data is None:
+        data = await fetch_attachment(
+            chunk.discord_message_id, chunk.shard, chunk.attachment_index or 0, chunk.attachment_url, messages
+        )
+        await chunk_cache.put(key, data)
+    if chunk.pack_id is not None:
+        # Packed small file: one fetch of the pack, then a slice
+        data = data[chunk.pack_offset:chunk.pack_offset + chunk.stored_size]
+    return await decompress_chunk(data, chunk.codec)
+
+async def read_pack(pack) -> bytes:
+    """Get the whole stored attachment of a pack."""
+    data = await chunk_cache.get(pack.discord_message_id)
+    if data is None:
+        # Only compaction reads whole packs, so it yields to user requests
+        data = await fetch_attachment(pack.discord_message_id, pack.shard, 0, pack.attachment_url, lane="background")
+        await chunk_cache.put(pack.discord_message_id, data)
+    return data
+
+async def fetch_attachment(
+    message_id: str,
+    shard: Optional[int],
+    attachment_index: int,
+    url: Optional[str],
+    messages: Optional[Dict[str, asyncio.Task]] = None,
+    lane: str = "read"
+) -> bytes:
+    """Fetch the bytes of a stored attachment from the storage shard holding it.
+
+    See DiscordBackend.get for how ``url`` and ``messages`` are used.
+    """
+    return await get_backend(shard).get(message_id, attachment_index, url=url, lane=lane, messages=messages)
+
+def url_needs_refresh(expires_at: Optional[datetime]) -> bool:
+    """Whether a CDN URL expires within ATTACHMENT_URL_REFRESH_MARGIN."""
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    margin = timedelta(seconds=settings.ATTACHMENT_URL_REFRESH_MARGIN)
+    return expires_at - margin <= datetime.now(timezone.utc)
+
+async def refresh_chunk_urls(chunks):
+    """Refresh expired CDN URLs of the given chunks and persist the new ones.
+
+    Only chunks that are about to be read are passed in, so a ranged
+    request never refreshes URLs it does not need. Failures are logged and
+    the affected chunks fall back to fetching their message.
+    """
+    stale = [
+        chunk for chunk in chunks
+        if chunk.attachment_url
+        and url_needs_refresh(chunk.url_expires_at)
+        and not chunk_cache.contains(get_chunk_cache_key(chunk))
+    ]
+    if not stale:
+        return
+    try:
+        # Each shard refreshes the URLs of its own channel
+        refreshed = {}
+        for shard in {chunk.shard or 0 for chunk in stale}:
+            urls = [chunk.attachment_url for chunk in stale if (chunk.shard or 0) == shard]
+            refreshed.update(await get_backend(shard).refresh_urls(urls))
+        async with AsyncSessionLocal() as db:
+            for chunk in stale:
+                url = refreshed.get(chunk.attachment_url)
+                if not url:
+                    continue
+                # Blobs and packs hand their URL to every new file that links to them
+                for table in ("file_chunks", "chunk_blobs", "packs"):
+                    await db.execute(
+                        text(f"""
+                            UPDATE {table} SET attachment_url = :url, url_expires_at = :expires_at
+                            WHERE discord_message_id = :message_id AND COALESCE(shard, 0) = :shard
+                              AND attachment_url = :old_url
+                        """),
+                        {
+                            "url": url,
+                            "expires_at": get_attachment_expiry(url),
+                            "message_id": chunk.discord_message_id,
+                            "shard": chunk.shard or 0,
+                            "old_url": chunk.attachment_url
+                        }
+                    )
+                chunk.attachment_url = url
+                chunk.url_expires_at = get_attachment_expiry(url)
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"Could not refresh {len(stale)} attachment URLs: {str(e)}")
+
+def get_prefetch_window() -> int:
+    """Number of chunks a single stream may hold in memory at once."""
+    by_memory = settings.DOWNLOAD_PREFETCH_MAX_BYTES // settings.CHUNK_SIZE
+    return max(1, min(settings.DOWNLOAD_PREFETCH + 1, by_memory))
+
+async def prefetch_chunks(chunks, fetch=read_chunk):
+    """Yield (chunk, data) in order while the following chunks download concurrently.
+
+    The chunk being sent plus those fetched ahead never exceed
+    get_prefetch_window(). Outstanding fetches are cancelled when the
+    generator is closed, e.g. because the client disconnected.
+    """
+    window = get_prefetch_window()
+    remaining = iter(chunks)
+    pending = deque()
+
+    def schedule(limit: int):
+        while len(pending) < limit:
+            chunk = next(remaining, None)
+            if chunk is None:
+                return
+            pending.append((chunk, asyncio.create_task(fetch(chunk))))
+
+    try:
+        while True:
+            schedule(window)
+            if not pending:
+                break
+            chunk, task = pending.popleft()
             try:
-                message = await bot.channel.fetch_message(discord_message_id)
-                attachment = message.attachments[0]
-                chunk = await attachment.read()
-                yield chunk
+                data = await task
             except Exception as e:
-                raise FileOperationException(f"Failed to fetch chunk {chunk_id} from Discord: {str(e)}")
-                
+                raise FileOperationException(f"Failed to fetch chunk {chunk.chunk_id} from Discord: {str(e)}")
+            # Keep the window full while this chunk is being sent
+            schedule(window - 1)
+            yield chunk, data
+            data = None
+    finally:
+        for _, task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+def get_file_size(chunks) -> Optional[int]:
+    """Total size of a file, or None if a chunk predates per-chunk sizes."""
+    if any(chunk.size is None for chunk in chunks):
+        return None
+    return sum(chunk.size for chunk in chunks)
+
+def parse_range_header(range_header: Optional[str], total_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be served (no header, a
+    malformed header or a multi-range request). Raises ValueError when the
+    range lies entirely outside the file.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else None
+        if end is not None and end < start:
+            return None
+    elif last:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        start, end = max(total_size - length, 0), total_size - 1
+    else:
+        return None
+    if start >= total_size:
+        raise ValueError(f"Range start {start} is beyond file size {total_size}")
+    if end is None or end >= total_size:
+        end = total_size - 1
+    return start, end
+
+def plan_chunk_range(chunks, start: int, end: int) -> List[Tuple[Any, int, int]]:
+    """Select the chunks overlapping bytes start..end (inclusive).
+
+    Returns (chunk, slice_start, slice_end) tuples giving the part of each
+    chunk that falls inside the range.
+    """
+    plan = []
+    offset = 0
+    for chunk in chunks:
+        chunk_start, chunk_end = offset, offset + chunk.size
+        offset = chunk_end
+        if chunk_end <= start:
+            continue
+        if chunk_start > end:
+            break
+        plan.append((chunk, max(start - chunk_start, 0), min(end + 1, chunk_end) - chunk_start))
+    return plan
+
+def stream_file_range(chunks, range_header: Optional[str] = None):
+    """Build the body, status code and range headers for streaming a file.
+
+    Only the chunks overlapping the requested range are fetched. Returns
+    None for the body when the range cannot be satisfied.
+    """
+    total_size = get_file_size(chunks)
+    if total_size is None:
+        # Legacy chunks without stored sizes: ranges cannot be mapped
+        plan = [(chunk, 0, None) for chunk in chunks]
+        return _ranged_generator(plan), status.HTTP_200_OK, {}
+
+    headers = {"Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_range_header(range_header, total_size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{total_size}"
+        return None, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers
+
+    if byte_range is None:
+        plan = [(chunk, 0, chunk.size) for chunk in chunks]
+        headers["Content-Length"] = str(total_size)
+        return _ranged_generator(plan), status.HTTP_200_OK, headers
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{total_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return _ranged_generator(plan_chunk_range(chunks, start, end)), status.HTTP_206_PARTIAL_CONTENT, headers
+
+async def _ranged_generator(plan):
+    await refresh_chunk_urls([chunk for chunk, _, _ in plan])
+    bounds = iter(plan)
+    messages = {}
+    fetch = partial(read_chunk, messages=messages)
+    try:
+        async with aclosing(prefetch_chunks([chunk for chunk, _, _ in plan], fetch)) as stream:
+            async for _, data in stream:
+                _, lo, hi = next(bounds)
+                if lo == 0 and (hi is None or hi == len(data)):
+                    yield data
+                else:
+                    yield data[lo:hi]
+    finally:
+        for task in messages.values():
+            task.cancel()
+
+def get_file_etag(chunks) -> str:
+    """Strong ETag derived from a file's chunk manifest.
+
+    Chunks are immutable once stored, so the ordered content hashes and
+    sizes identify the bytes exactly. Legacy chunks without a content hash
+    fall back to their storage location.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        identity = chunk.content_hash or f"{chunk.discord_message_id}:{chunk.attachment_index}:{chunk.pack_offset}"
+        digest.update(f"{chunk.chunk_id}:{identity}:{chunk.size};".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+def get_cache_headers(file, chunks, immutable: bool = False) -> Dict[str, str]:
+    """Validators and Cache-Control for serving a file's content.
+
+    Content addressed by file id never changes and may be cached for
+    FILE_CACHE_MAX_AGE; name-based URLs get FILE_NAME_CACHE_MAX_AGE since
+    the name can be reused by another upload.
+    """
+    if immutable:
+        cache_control = f"{settings.FILE_CACHE_SCOPE}, max-age={settings.FILE_CACHE_MAX_AGE}, immutable"
+    else:
+        cache_control = f"{settings.FILE_CACHE_SCOPE}, max-age={settings.FILE_NAME_CACHE_MAX_AGE}, must-revalidate"
+    headers = {"ETag": get_file_etag(chunks), "Cache-Control": cache_control}
+    if file.created_at:
+        headers["Last-Modified"] = format_datetime(file.created_at.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _not_modified_since(header: str, last_modified: Optional[str]) -> bool:
+    if not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        # Unparseable or naive dates are ignored, as RFC 9110 requires
+        return False
+
+def is_not_modified(
+    cache_headers: Dict[str, str],
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None
+) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    when it is absent.
+    """
+    if if_none_match:
+        return _etag_matches(if_none_match, cache_headers["ETag"], weak=True)
+    if if_modified_since:
+        return _not_modified_since(if_modified_since, cache_headers.get("Last-Modified"))
+    return False
+
+def apply_if_range(range_header: Optional[str], if_range: Optional[str], cache_headers: Dict[str, str]) -> Optional[str]:
+    """Drop the Range header when If-Range no longer matches, so the full file is sent."""
+    if not range_header or not if_range:
+        return range_header
+    if if_range.strip().startswith(('"', "W/")):
+        matches = _etag_matches(if_range, cache_headers["ETag"], weak=False)
+    else:
+        last_modified = cache_headers.get("Last-Modified")
+        matches = last_modified is not None and if_range.strip() == last_modified
+    return range_header if matches else None
+
+def not_modified_response(cache_headers: Dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+async def create_file_download_stream(
+    filename: str,
+    chunks,
+    range_header: Optional[str] = None,
+    cache_headers: Optional[Dict[str, str]] = None
+):
+    """Create a streaming response for file download."""
+    body, status_code, range_headers = stream_file_range(chunks, range_header)
     mime_type = get_mime_type(filename)
+    if body is None:
+        return Response(status_code=status_code, headers=range_headers)
         
     return StreamingResponse(
-        file_generator(), 
+        body, 
+        status_code=status_code,
         media_type=mime_type, 
         headers={
             "Content-Disposition": f"attachment; filename={filename}",
             "Content-Type": mime_type,
             "X-File-Name": filename,
             "X-File-Type": mime_type,
-            "Cache-Control": "no-cache"
+            "Cache-Control": "no-cache",
+            **(cache_headers or {}),
+            **range_headers
         }
     )
 
-async def create_file_view_stream(filename: str, chunks):
+async def create_file_view_stream(
+    filename: str,
+    chunks,
+    range_header: Optional[str] = None,
+    cache_headers: Optional[Dict[str, str]] = None
+):
     """Create a streaming response for viewing a file with enhanced frontend support."""
-    async def file_generator():
-        for chunk_id, discord_message_id in chunks:
-            try:
-                message = await bot.channel.fetch_message(discord_message_id)
-                attachment = message.attachments[0]
-                chunk = await attachment.read()
-                yield chunk
-            except Exception as e:
-                raise FileOperationException(f"Failed to fetch chunk {chunk_id} from Discord: {str(e)}")
-    
     # Get MIME type and check if viewable
     mime_type = get_mime_type(filename)
     is_viewable = is_file_viewable(mime_type)
@@ -268,38 +997,35 @@ async def create_file_view_stream(filename: str, chunks):
         "X-File-Category": file_type,
         "Cache-Control": "no-cache"
     }
+    headers.update(cache_headers or {})
+    
+    body, status_code, range_headers = stream_file_range(chunks, range_header)
+    headers.update(range_headers)
+    if body is None:
+        return Response(status_code=status_code, headers=range_headers)
     
     return StreamingResponse(
-        file_generator(),
+        body,
+        status_code=status_code,
         media_type=mime_type,
         headers=headers
     )
 
 async def get_file_metadata(db: AsyncSession, filename: str, folder_id: int, user_id: int) -> Dict[str, Any]:
     """Get metadata about a file without retrieving its contents."""
-    # Verify the file exists and belongs to the user
-    result = await db.execute(
-        text("""
-            SELECT COUNT(*) as chunk_count 
-            FROM file_chunks 
-            WHERE file_name = :filename AND folder_id = :folder_id
-        """),
-        {"filename": filename, "folder_id": folder_id}
-    )
-    file_info = result.fetchone()
-    
-    if not file_info or file_info.chunk_count == 0:
-        raise NotFoundException(f"File {filename} not found in folder {folder_id}")
-        
-    # Get file metadata
-    mime_type = get_mime_type(filename)
-    is_viewable = is_file_viewable(mime_type)
-    file_type = get_file_type_category(mime_type)
-    
+    file = await get_file(db, filename, folder_id, user_id)
+    return {**get_file_info(file), "chunk_count": file.chunk_count}
+
+def get_file_info(file) -> Dict[str, Any]:
+    """Describe a files row for API responses."""
+    mime_type = file.mime_type or get_mime_type(file.name)
     return {
-        "name": filename,
+        "id": file.id,
+        "name": file.name,
+        "size": file.size,
+        "chunks": file.chunk_count,
         "mime_type": mime_type,
-        "viewable": is_viewable,
-        "type": file_type,
-        "chunk_count": file_info.chunk_count
-    }
\ No newline at end of file
+        "viewable": is_file_viewable(mime_type),
+        "type": file.category or get_file_type_category(mime_type),
+        "created_at": file.created_at
+    }
@@ -1,30 +1,29 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.exceptions import NotFoundException, DatabaseException
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.exceptions import NotFoundException, DatabaseException, ValidationException
 from app.utils.constants import FOLDER_NOT_FOUND
+from app.utils.pagination import keyset_query, paginate_rows
+from app.services.dedup_service import release_chunks
+from app.services.naming_service import insert_with_unique_name, drop_name_counters
 
 async def create_folder(db: AsyncSession, name: str, user_id: int):
     """Create a new folder for a user."""
     try:
-        # Check if folder name exists for this user
-        result = await db.execute(
-            text("SELECT name FROM folders WHERE name LIKE :name AND user_id = :user_id"), 
-            {"name": f"{name}%", "user_id": user_id}
-        )
-        existing_folders = result.fetchall()
-        
-        if existing_folders:
-            name = f"{name}_{len(existing_folders) + 1}"
+        # The unique (user_id, name) constraint picks a free name even under concurrent creates
+        async def insert(candidate: str):
+            result = await db.execute(
+                text("""
+                    INSERT INTO folders (name, user_id)
+                    VALUES (:name, :user_id)
+                    RETURNING id, name, user_id
+                """),
+                {"name": candidate, "user_id": user_id}
+            )
+            return result.fetchone()
         
-        # Insert new folder with user_id
-        query = text("""
-            INSERT INTO folders (name, user_id)
-            VALUES (:name, :user_id)
-            RETURNING id, name, user_id
-        """)
-        
-        result = await db.execute(query, {"name": name, "user_id": user_id})
-        new_folder = result.fetchone()
+        new_folder = await insert_with_unique_name(db, "folder", user_id, name, insert, keep_extension=False)
         await db.commit()
         
         return {
@@ -51,11 +50,17 @@ async def delete_folder(db: AsyncSession, folder_name: str, user_id: int):
         
         folder_id = folder.id
         
-        # Delete all file chunks in the folder
+        # Delete all file chunks in the folder and queue the messages no other file uses
+        await release_chunks(db, "folder_id = :folder_id", {"folder_id": folder_id})
         await db.execute(
-            text("DELETE FROM file_chunks WHERE folder_id = :folder_id"), 
+            text("DELETE FROM files WHERE folder_id = :folder_id"),
             {"folder_id": folder_id}
         )
+        await db.execute(
+            text("DELETE FROM upload_sessions WHERE folder_id = :folder_id"),
+            {"folder_id": folder_id}
+        )
+        await drop_name_counters(db, "file", folder_id)
         
         # Delete the folder
         await db.execute(
@@ -71,15 +76,41 @@ async def delete_folder(db: AsyncSession, folder_name: str, user_id: int):
         await db.rollback()
         raise DatabaseException(f"Error deleting folder: {str(e)}")
 
-async def list_folders(db: AsyncSession, user_id: int):
-    """List all folders belonging to a user."""
+# Public sort names of folder listings; folders have no timestamp, ids follow creation order
+FOLDER_SORTS = {"name": "name", "date": "id"}
+
+async def list_folders(
+    db: AsyncSession,
+    user_id: int,
+    sort: str = "name",
+    order: str = "asc",
+    limit: int = settings.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    with_total: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+    """List one page of the folders belonging to a user.
+
+    Returns (folders, next cursor or None, total or None); the total is
+    only counted when ``with_total`` is set.
+    """
     try:
+        where, order_by, params = keyset_query(FOLDER_SORTS, sort, order, cursor)
         result = await db.execute(
-            text("SELECT id, name FROM folders WHERE user_id = :user_id"),
-            {"user_id": user_id}
+            text(f"SELECT id, name FROM folders WHERE user_id = :user_id {where} {order_by} LIMIT :limit"),
+            {"user_id": user_id, "limit": limit + 1, **params}
         )
-        folders = result.fetchall()
-        return [{"id": folder.id, "name": folder.name} for folder in folders]
+        folders, next_cursor = paginate_rows(result.fetchall(), limit, FOLDER_SORTS, sort, order)
+        
+        total = None
+        if with_total:
+            result = await db.execute(
+                text("SELECT COUNT(*) FROM folders WHERE user_id = :user_id"),
+                {"user_id": user_id}
+            )
+            total = result.scalar()
+        return [{"id": folder.id, "name": folder.name} for folder in folders], next_cursor, total
+    except ValidationException as e:
+        raise e
     except Exception as e:
         raise DatabaseException(f"Error listing folders: {str(e)}")
 
@@ -0,0 +1,86 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import text
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.exceptions import DatabaseException
+
+T = TypeVar("T")
+
+# Attempts before giving up on a name; only reached when many suffixed
+# names were created by hand or by the old prefix-counting scheme
+MAX_NAME_ATTEMPTS = 50
+
+# Unique constraint deciding who gets a name, per scope; see models.py
+NAME_CONSTRAINTS = {"file": "uq_files_folder_id_name", "folder": "uq_folders_user_id_name"}
+
+def get_violated_constraint(error: IntegrityError) -> Optional[str]:
+    """Name of the constraint behind an IntegrityError, if the driver reports it."""
+    # asyncpg errors are wrapped by SQLAlchemy's adapter; psycopg exposes diag
+    for candidate in (error.orig, getattr(error.orig, "__cause__", None)):
+        name = getattr(candidate, "constraint_name", None)
+        if name is None:
+            name = getattr(getattr(candidate, "diag", None), "constraint_name", None)
+        if name:
+            return name
+    return None
+
+def suffixed_name(name: str, suffix: int, keep_extension: bool = True) -> str:
+    """``report.pdf`` -> ``report_2.pdf``; folders keep the suffix at the end."""
+    if keep_extension and '.' in name:
+        stem, extension = name.rsplit('.', 1)
+        return f"{stem}_{suffix}.{extension}"
+    return f"{name}_{suffix}"
+
+async def next_name_suffix(db: AsyncSession, scope: str, owner_id: int, name: str) -> int:
+    """Take the next suffix for a taken name, in the caller's transaction.
+
+    One upsert on the counter's primary key, so the cost does not depend on
+    how many files the folder holds. The counter row stays locked until the
+    caller commits, so concurrent uploads of the same name queue briefly on
+    it; a suffix taken by a rolled back upload is handed out again.
+    """
+    result = await db.execute(
+        text("""
+            INSERT INTO name_counters (scope, owner_id, name, next_suffix)
+            VALUES (:scope, :owner_id, :name, 2)
+            ON CONFLICT (scope, owner_id, name)
+            DO UPDATE SET next_suffix = name_counters.next_suffix + 1
+            RETURNING next_suffix
+        """),
+        {"scope": scope, "owner_id": owner_id, "name": name}
+    )
+    return result.scalar()
+
+async def insert_with_unique_name(
+    db: AsyncSession,
+    scope: str,
+    owner_id: int,
+    name: str,
+    insert: Callable[[str], Awaitable[T]],
+    keep_extension: bool = True
+) -> T:
+    """Run ``insert(name)`` in a savepoint, retrying with suffixed names on conflict.
+
+    The unique constraint on the table decides who gets a name, so
+    concurrent requests for the same name each end up with a distinct one.
+    Any other integrity error, e.g. the folder being deleted meanwhile, is
+    raised as is. The caller's transaction is left open.
+    """
+    candidate = name
+    for _ in range(MAX_NAME_ATTEMPTS):
+        try:
+            async with db.begin_nested():
+                return await insert(candidate)
+        except IntegrityError as e:
+            if get_violated_constraint(e) != NAME_CONSTRAINTS[scope]:
+                raise
+            candidate = suffixed_name(name, await next_name_suffix(db, scope, owner_id, name), keep_extension)
+    raise DatabaseException(f"Could not find a free name for {name}")
+
+async def drop_name_counters(db: AsyncSession, scope: str, owner_id: int):
+    """Forget the counters of a deleted folder or user, in the caller's transaction."""
+    await db.execute(
+        text("DELETE FROM name_counters WHERE scope = :scope AND owner_id = :owner_id"),
+        {"scope": scope, "owner_id": owner_id}
+    )
@@ -0,0 +1,178 @@
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.logger import logger
+from app.services.storage_service import upload_chunk_batch
+from app.services.delete_service import enqueue_deletions, schedule_deletions
+from app.services.dedup_service import filter_unreferenced_messages
+
+class PackBuilder:
+    """Appends the stored bytes of small files into shared pack blobs.
+
+    Each pack is uploaded as one attachment once adding the next file
+    would exceed PACK_MAX_BYTES; members are located by (pack_offset,
+    stored_size). Packs are sent in the background with up to
+    UPLOAD_CONCURRENCY in flight, and the column dicts passed to add() are
+    filled in once their pack is stored.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.members: List[Dict[str, Any]] = []
+        self.packs: List[Dict[str, Any]] = []
+        self.window = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+        self.tasks: List[asyncio.Task] = []
+
+    async def add(self, payload: bytes, columns: Dict[str, Any]):
+        if self.buffer and len(self.buffer) + len(payload) > settings.PACK_MAX_BYTES:
+            await self.flush()
+        columns.update(pack_offset=len(self.buffer), stored_size=len(payload))
+        self.buffer += payload
+        self.members.append(columns)
+
+    async def flush(self):
+        if not self.members:
+            return
+        data, members = bytes(self.buffer), self.members
+        self.buffer, self.members = bytearray(), []
+        await self.window.acquire()
+        failed = next((t for t in self.tasks if t.done() and t.exception()), None)
+        if failed:
+            self.window.release()
+            raise failed.exception()
+        self.tasks.append(asyncio.create_task(self._send(data, members)))
+
+    async def _send(self, data: bytes, members: List[Dict[str, Any]]):
+        try:
+            location = (await upload_chunk_batch([(data, f"pack-{len(members)}.bin")]))[0]
+            for columns in members:
+                columns.update(location)
+            self.packs.append({**location, "size": len(data), "members": members})
+        finally:
+            self.window.release()
+
+    async def close(self) -> List[Dict[str, Any]]:
+        """Send the last pack, wait for every pack to be stored and return them."""
+        await self.flush()
+        await asyncio.gather(*self.tasks)
+        return self.packs
+
+    async def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+async def add_packs(db: AsyncSession, packs: List[Dict[str, Any]]):
+    """Insert pack rows in the caller's transaction and point their members at them."""
+    for pack in packs:
+        result = await db.execute(
+            text("""
+                INSERT INTO packs (discord_message_id, shard, attachment_url, url_expires_at, size)
+                VALUES (:discord_message_id, :shard, :attachment_url, :url_expires_at, :size)
+                RETURNING id
+            """),
+            {
+                "discord_message_id": pack["discord_message_id"],
+                "shard": pack["shard"],
+                "attachment_url": pack["attachment_url"],
+                "url_expires_at": pack["url_expires_at"],
+                "size": pack["size"]
+            }
+        )
+        pack_id = result.scalar()
+        for columns in pack["members"]:
+            columns["pack_id"] = pack_id
+
+async def compact_packs() -> int:
+    """Rewrite packs whose live content has fallen below PACK_COMPACTION_LIVE_RATIO.
+
+    Live members are copied into a new pack, every blob and file chunk is
+    repointed and the old message is queued for deletion in one transaction.
+    Packs with nothing left in them are simply dropped. Returns the number
+    of packs compacted.
+    """
+    # Imported here to avoid a cycle: file_service imports this module
+    from app.services.file_service import read_pack
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("""
+                SELECT p.id, p.discord_message_id, p.shard, p.attachment_url, p.url_expires_at, p.size,
+                       COALESCE(SUM(b.stored_size), 0) AS live_bytes
+                FROM packs p
+                LEFT JOIN chunk_blobs b ON b.pack_id = p.id
+                GROUP BY p.id, p.discord_message_id, p.shard, p.attachment_url, p.url_expires_at, p.size
+                HAVING COALESCE(SUM(b.stored_size), 0) < p.size * :ratio
+            """),
+            {"ratio": settings.PACK_COMPACTION_LIVE_RATIO}
+        )
+        candidates = result.fetchall()
+
+    compacted = 0
+    for pack in candidates:
+        try:
+            await _compact_pack(pack, read_pack)
+            compacted += 1
+        except Exception as e:
+            logger.error(f"Error compacting pack {pack.id}: {str(e)}")
+    return compacted
+
+async def _compact_pack(pack, read_pack):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("SELECT pack_offset, stored_size FROM chunk_blobs WHERE pack_id = :pack_id ORDER BY pack_offset"),
+            {"pack_id": pack.id}
+        )
+        members = result.fetchall()
+
+        new_packs = []
+        if members:
+            data = await read_pack(pack)
+            builder = PackBuilder()
+            moves = []
+            for member in members:
+                columns = {"old_offset": member.pack_offset}
+                moves.append(columns)
+                await builder.add(data[member.pack_offset:member.pack_offset + member.stored_size], columns)
+            new_packs = await builder.close()
+
+        try:
+            if new_packs:
+                await add_packs(db, new_packs)
+                for columns in moves:
+                    for table in ("chunk_blobs", "file_chunks"):
+                        await db.execute(
+                            text(f"""
+                                UPDATE {table}
+                                SET pack_id = :pack_id, pack_offset = :pack_offset,
+                                    discord_message_id = :discord_message_id, shard = :shard,
+                                    attachment_index = :attachment_index,
+                                    attachment_url = :attachment_url, url_expires_at = :url_expires_at
+                                WHERE pack_id = :old_pack_id AND pack_offset = :old_offset
+                            """),
+                            {**columns, "old_pack_id": pack.id}
+                        )
+            await db.execute(text("DELETE FROM packs WHERE id = :id"), {"id": pack.id})
+            messages = await filter_unreferenced_messages(db, [(pack.discord_message_id, pack.shard or 0)])
+            await enqueue_deletions(db, messages)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await schedule_deletions([(new_pack["discord_message_id"], new_pack["shard"]) for new_pack in new_packs])
+            raise
+    logger.info(f"Compacted pack {pack.id}: kept {len(members)} members of a {pack.size} byte pack")
+
+async def run_pack_compactor():
+    """Background loop compacting packs every PACK_COMPACTION_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(settings.PACK_COMPACTION_INTERVAL)
+        try:
+            compacted = await compact_packs()
+            if compacted:
+                logger.info(f"Compacted {compacted} packs")
+        except Exception as e:
+            logger.error(f"Error running pack compaction: {str(e)}")
@@ -0,0 +1,488 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import discord
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.exceptions import DiscordBotException, FileOperationException, NotFoundException
+from app.logger import logger
+from app.services.discord_service import (
+    get_bot, ensure_bot_ready, fetch_message, download_attachment,
+    refresh_attachment_urls, delete_message, bulk_delete_messages, can_bulk_delete,
+    get_attachment_expiry, BULK_DELETE_BATCH
+)
+
+try:
+    import boto3
+except ImportError:  # Only needed for s3: storage shards
+    boto3 = None
+
+def _as_bytes(parts: List[Tuple[Any, str]]) -> List[Tuple[bytes, str]]:
+    # Streaming uploads hand over memoryviews of pooled buffers, which are
+    # reused once the upload returns; backends always get their own bytes
+    return [(data if isinstance(data, bytes) else bytes(data), filename) for data, filename in parts]
+
+class StorageBackend(ABC):
+    """Where the bytes of one storage shard live.
+
+    Objects are written in batches: put_batch() stores several parts under
+    one key, addressed afterwards by (key, index). The key is kept in the
+    discord_message_id column whatever the backend, so deduplication,
+    packs and the delete outbox work the same everywhere. Locations are the
+    FileChunk column values describing where a part was stored.
+    """
+    kind = "base"
+    # Whether get_range() reads only the requested bytes
+    supports_range = False
+
+    def __init__(self, shard: int):
+        self.shard = shard
+        self._uploads = 0
+
+    @property
+    def uploads_in_flight(self) -> int:
+        """Batches being stored right now, used by the least_loaded placement policy."""
+        return self._uploads
+
+    async def ensure_ready(self):
+        """Raise if the backend cannot take uploads."""
+
+    async def put(self, data: bytes, filename: str, content: str = "") -> Dict[str, Any]:
+        return (await self.put_batch([(data, filename)], content))[0]
+
+    async def put_batch(self, parts: List[Tuple[bytes, str]], content: str = "") -> List[Dict[str, Any]]:
+        """Store (bytes, filename) parts under one new key and return their locations, in order."""
+        self._uploads += 1
+        try:
+            return await self._put_batch(_as_bytes(parts), content)
+        finally:
+            self._uploads -= 1
+
+    @abstractmethod
+    async def _put_batch(self, parts: List[Tuple[bytes, str]], content: str) -> List[Dict[str, Any]]:
+        """Store the parts under one new key."""
+
+    @abstractmethod
+    async def get(
+        self,
+        key: str,
+        index: int = 0,
+        url: Optional[str] = None,
+        lane: str = "read",
+        messages: Optional[Dict[str, asyncio.Task]] = None
+    ) -> bytes:
+        """One part of a stored key."""
+
+    async def get_range(self, key: str, index: int, start: int, end: int, **kwargs) -> bytes:
+        """Bytes start..end (exclusive) of a part; backends without ranged reads slice the whole part."""
+        return (await self.get(key, index, **kwargs))[start:end]
+
+    @abstractmethod
+    async def delete(self, keys: List[str]) -> List[str]:
+        """Delete every part of the given keys, returning the keys that are gone."""
+
+    async def refresh_urls(self, urls: List[str]) -> Dict[str, str]:
+        """Exchange expiring download URLs for fresh ones; only Discord has any."""
+        return {}
+
+    def location(self, key: str, index: int, url: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "discord_message_id": key,
+            "attachment_index": index,
+            "attachment_url": url,
+            "url_expires_at": get_attachment_expiry(url) if url else None,
+            "shard": self.shard
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"shard": self.shard, "kind": self.kind, "uploads_in_flight": self.uploads_in_flight}
+
+class DiscordBackend(StorageBackend):
+    """A bot and its channel: every key is a message, every part an attachment."""
+    kind = "discord"
+
+    def __init__(self, shard: int):
+        super().__init__(shard)
+        self.bot = get_bot(shard)
+
+    @property
+    def uploads_in_flight(self) -> int:
+        # The bot counts its own sends, including their scheduler wait
+        return self.bot.uploads_in_flight
+
+    async def ensure_ready(self):
+        await ensure_bot_ready(self.shard)
+
+    async def _put_batch(self, parts: List[Tuple[bytes, str]], content: str) -> List[Dict[str, Any]]:
+        message = await self.bot.upload_chunks(parts, content)
+        if len(message.attachments) != len(parts):
+            raise DiscordBotException(f"Message {message.id} has {len(message.attachments)} attachments, expected {len(parts)}")
+        return [self.location(str(message.id), index, message.attachments[index].url) for index in range(len(parts))]
+
+    async def get(
+        self,
+        key: str,
+        index: int = 0,
+        url: Optional[str] = None,
+        lane: str = "read",
+        messages: Optional[Dict[str, asyncio.Task]] = None
+    ) -> bytes:
+        """Download an attachment, straight from its CDN URL when one is stored.
+
+        The message is only fetched for older chunks or when the URL has
+        stopped working. Passing the same ``messages`` dict for a whole
+        stream fetches each message once however many of its attachments
+        are read.
+        """
+        if url:
+            try:
+                return await download_attachment(url, self.shard, lane)
+            except (discord.NotFound, discord.Forbidden):
+                logger.warning(f"CDN URL for message {key} rejected, fetching message")
+        if messages is None:
+            message = await fetch_message(key, self.shard, lane)
+        else:
+            task = messages.get(key)
+            if task is None:
+                task = asyncio.create_task(fetch_message(key, self.shard, lane))
+                messages[key] = task
+            # Shielded so one cancelled reader does not cancel the fetch for the others
+            message = await asyncio.shield(task)
+        return await download_attachment(message.attachments[index].url, self.shard, lane)
+
+    async def delete(self, keys: List[str]) -> List[str]:
+        deleted = []
+        recent = [key for key in keys if can_bulk_delete(key)]
+        old = [key for key in keys if not can_bulk_delete(key)]
+        for start in range(0, len(recent), BULK_DELETE_BATCH):
+            batch = recent[start:start + BULK_DELETE_BATCH]
+            if len(batch) > 1:
+                try:
+                    await bulk_delete_messages(batch, self.shard)
+                    deleted.extend(batch)
+                    continue
+                except Exception as e:
+                    # e.g. missing Manage Messages permission or an unknown message in the batch
+                    logger.warning(f"Bulk delete of {len(batch)} messages on shard {self.shard} failed: {str(e)}")
+            old.extend(batch)
+        for key in old:
+            if await delete_message(key, self.shard):
+                deleted.append(key)
+        return deleted
+
+    async def refresh_urls(self, urls: List[str]) -> Dict[str, str]:
+        return await refresh_attachment_urls(urls, self.shard)
+
+class LocalDiskBackend(StorageBackend):
+    """Parts stored as files under ``root``, e.g. on fast local storage for hot data."""
+    kind = "local"
+    supports_range = True
+
+    def __init__(self, shard: int, root: str):
+        super().__init__(shard)
+        self.root = root
+
+    def _path(self, key: str, index: int) -> str:
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.root, key[:2], f"{key}.{index}")
+
+    async def ensure_ready(self):
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+
+    def _write(self, key: str, parts: List[Tuple[bytes, str]]):
+        directory = os.path.join(self.root, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        for index, (data, _) in enumerate(parts):
+            path = self._path(key, index)
+            temp = f"{path}.tmp"
+            with open(temp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # Readers never see a partially written part
+            os.replace(temp, path)
+        # Persist the renames too, so a stored key survives a crash
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    async def _put_batch(self, parts: List[Tuple[bytes, str]], content: str) -> List[Dict[str, Any]]:
+        key = uuid.uuid4().hex
+        await asyncio.to_thread(self._write, key, parts)
+        return [self.location(key, index) for index in range(len(parts))]
+
+    def _read(self, key: str, index: int, start: int = 0, end: Optional[int] = None) -> bytes:
+        try:
+            with open(self._path(key, index), "rb") as f:
+                f.seek(start)
+                return f.read() if end is None else f.read(end - start)
+        except FileNotFoundError:
+            raise NotFoundException(f"Stored object {key}.{index} not found on shard {self.shard}")
+
+    async def get(self, key: str, index: int = 0, **kwargs) -> bytes:
+        return await asyncio.to_thread(self._read, key, index)
+
+    async def get_range(self, key: str, index: int, start: int, end: int, **kwargs) -> bytes:
+        return await asyncio.to_thread(self._read, key, index, start, end)
+
+    def _remove(self, keys: List[str]) -> List[str]:
+        for key in keys:
+            directory = os.path.join(self.root, key[:2])
+            try:
+                names = [name for name in os.listdir(directory) if name.startswith(f"{key}.")]
+            except FileNotFoundError:
+                continue
+            for name in names:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+        return keys
+
+    async def delete(self, keys: List[str]) -> List[str]:
+        return await asyncio.to_thread(self._remove, keys)
+
+class StagingBackend(LocalDiskBackend):
+    """Local write-back staging: chunks are acknowledged once written here.
+
+    Rows pointing at STAGING_SHARD are pending; the write-back flusher
+    copies them to a real shard and repoints them. Every object is leased
+    in staging_leases before it is written, and the uploading worker keeps
+    renewing the lease until rows reference the object, so recovery never
+    removes an object whose upload is still running, however long it takes.
+    """
+    kind = "staging"
+
+    def __init__(self, shard: int, root: str):
+        super().__init__(shard, root)
+        # Keys this process staged whose lease it still renews
+        self.leased: Set[str] = set()
+
+    async def _put_batch(self, parts: List[Tuple[bytes, str]], content: str) -> List[Dict[str, Any]]:
+        key = uuid.uuid4().hex
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                text("""
+                    INSERT INTO staging_leases (discord_message_id, expires_at)
+                    VALUES (:key, now() + make_interval(secs => :ttl))
+                """),
+                {"key": key, "ttl": settings.STAGING_LEASE_TTL}
+            )
+            await db.commit()
+        await asyncio.to_thread(self._write, key, parts)
+        self.leased.add(key)
+        return [self.location(key, index) for index in range(len(parts))]
+
+    async def delete(self, keys: List[str]) -> List[str]:
+        self.leased.difference_update(keys)
+        return await super().delete(keys)
+
+    def _list(self, min_age: float) -> List[str]:
+        cutoff = time.time() - min_age
+        keys = set()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    if name.endswith(".tmp"):
+                        # Left behind by a write that never finished
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                keys.add(name.rpartition(".")[0])
+        return sorted(keys)
+
+    async def list_keys(self, min_age: float = 0) -> List[str]:
+        """Keys of staged objects last written at least ``min_age`` seconds ago."""
+        return await asyncio.to_thread(self._list, min_age)
+
+class S3Backend(StorageBackend):
+    """Parts stored as objects ``<prefix><key>/<index>`` in an S3-compatible bucket.
+
+    S3_ENDPOINT_URL points it at a local stand-in such as MinIO.
+    Credentials come from the usual AWS environment variables or config.
+    """
+    kind = "s3"
+    supports_range = True
+
+    # S3 deletes at most 1000 objects per request
+    DELETE_BATCH = 1000
+
+    def __init__(self, shard: int, bucket: str, prefix: str = ""):
+        super().__init__(shard)
+        if boto3 is None:
+            raise RuntimeError("s3: storage shards need boto3, install it with `pip install boto3`")
+        self.bucket = bucket
+        self.prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None
+        )
+
+    def _object_key(self, key: str, index: int) -> str:
+        return f"{self.prefix}{key}/{index}"
+
+    async def ensure_ready(self):
+        await asyncio.to_thread(self.client.head_bucket, Bucket=self.bucket)
+
+    async def _put_batch(self, parts: List[Tuple[bytes, str]], content: str) -> List[Dict[str, Any]]:
+        key = uuid.uuid4().hex
+        await asyncio.gather(*(
+            asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self._object_key(key, index), Body=data)
+            for index, (data, _) in enumerate(parts)
+        ))
+        return [self.location(key, index) for index in range(len(parts))]
+
+    def _read(self, key: str, index: int, byte_range: Optional[str] = None) -> bytes:
+        request = {"Bucket": self.bucket, "Key": self._object_key(key, index)}
+        if byte_range:
+            request["Range"] = byte_range
+        try:
+            return self.client.get_object(**request)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            raise NotFoundException(f"Stored object {key}/{index} not found on shard {self.shard}")
+
+    async def get(self, key: str, index: int = 0, **kwargs) -> bytes:
+        return await asyncio.to_thread(self._read, key, index)
+
+    async def get_range(self, key: str, index: int, start: int, end: int, **kwargs) -> bytes:
+        if end <= start:
+            return b""
+        return await asyncio.to_thread(self._read, key, index, f"bytes={start}-{end - 1}")
+
+    def _remove(self, keys: List[str]) -> List[str]:
+        objects = []
+        for key in keys:
+            listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=f"{self.prefix}{key}/")
+            objects.extend({"Key": item["Key"]} for item in listing.get("Contents", []))
+        for start in range(0, len(objects), self.DELETE_BATCH):
+            result = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": objects[start:start + self.DELETE_BATCH], "Quiet": True}
+            )
+            if result.get("Errors"):
+                raise FileOperationException(f"Could not delete {len(result['Errors'])} objects from {self.bucket}")
+        return keys
+
+    async def delete(self, keys: List[str]) -> List[str]:
+        return await asyncio.to_thread(self._remove, keys)
+
+def create_backends() -> Dict[int, StorageBackend]:
+    """One backend per STORAGE_SHARDS entry, keyed by shard number.
+
+    ``local:<directory>`` and ``s3:<bucket>[/<prefix>]`` entries get disk
+    and S3 backends; every other entry is a Discord ``token:channel_id``.
+    """
+    entries = [entry.strip() for entry in settings.STORAGE_SHARDS.split(",")] if settings.STORAGE_SHARDS.strip() else [""]
+    backends = {}
+    for shard, entry in enumerate(entries):
+        if entry.startswith("local:"):
+            backends[shard] = LocalDiskBackend(shard, entry[len("local:"):])
+        elif entry.startswith("s3:"):
+            bucket, _, prefix = entry[len("s3:"):].partition("/")
+            backends[shard] = S3Backend(shard, bucket, prefix)
+        else:
+            backends[shard] = DiscordBackend(shard)
+    return backends
+
+backends = create_backends()
+# Shards taking new uploads; all of them unless UPLOAD_SHARDS narrows it down
+upload_shards = [
+    int(shard) for shard in settings.UPLOAD_SHARDS.split(",") if shard.strip()
+] or sorted(backends)
+
+# Write-back staging is registered like a shard, so pending chunks are read
+# from it without special cases. It stays readable when WRITE_BACK_ENABLED
+# is turned off, until the flusher has drained it.
+STAGING_SHARD = -1
+staging = StagingBackend(STAGING_SHARD, settings.STAGING_DIR)
+backends[STAGING_SHARD] = staging
+
+def get_backend(shard: Optional[int]) -> StorageBackend:
+    """Backend of the shard an object was stored on; objects from before sharding are on shard 0."""
+    backend = backends.get(shard or 0)
+    if backend is None:
+        raise FileOperationException(f"Storage shard {shard or 0} is not configured")
+    return backend
+
+_round_robin = itertools.count()
+
+def _place_round_robin(key: Optional[str]) -> int:
+    return upload_shards[next(_round_robin) % len(upload_shards)]
+
+def _place_least_loaded(key: Optional[str]) -> int:
+    # Ties go round robin so idle shards still share the load
+    start = next(_round_robin)
+    order = [upload_shards[(start + offset) % len(upload_shards)] for offset in range(len(upload_shards))]
+    return min(order, key=lambda shard: backends[shard].uploads_in_flight)
+
+def _place_hash(key: Optional[str]) -> int:
+    if key is None:
+        return _place_round_robin(key)
+    return upload_shards[int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % len(upload_shards)]
+
+# Placement policies map an optional placement key (the chunk's content
+# hash when known) to a shard number. Add an entry to plug in a new one.
+PLACEMENT_POLICIES: Dict[str, Callable[[Optional[str]], int]] = {
+    "round_robin": _place_round_robin,
+    "least_loaded": _place_least_loaded,
+    "hash": _place_hash,
+}
+
+def pick_shard(key: Optional[str] = None) -> StorageBackend:
+    """Choose the backend a new upload goes to according to SHARD_PLACEMENT."""
+    policy = PLACEMENT_POLICIES.get(settings.SHARD_PLACEMENT)
+    if policy is None:
+        raise FileOperationException(f"Unknown shard placement policy {settings.SHARD_PLACEMENT}")
+    return backends[policy(key)]
+
+def _upload_backend(key: Optional[str]) -> StorageBackend:
+    return staging if settings.WRITE_BACK_ENABLED else pick_shard(key)
+
+async def ensure_storage_ready():
+    """Ensure every shard taking uploads is reachable.
+
+    In write-back mode uploads only touch the staging area, so they keep
+    working while the shards behind it are slow or down.
+    """
+    if settings.WRITE_BACK_ENABLED:
+        await staging.ensure_ready()
+        return
+    await asyncio.gather(*(backends[shard].ensure_ready() for shard in upload_shards))
+
+async def upload_file_chunk(chunk: bytes, filename: str, chunk_id: int, key: Optional[str] = None) -> Dict[str, Any]:
+    """Store a file chunk, or stage it when WRITE_BACK_ENABLED, and return where it was stored.
+
+    ``key`` is passed to the placement policy, e.g. the chunk's content hash.
+    """
+    return await _upload_backend(key).put(chunk, f"{filename}.part{chunk_id}", f"Chunk {chunk_id} of {filename}")
+
+async def upload_chunk_batch(parts: List[Tuple[bytes, str]], key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Store several chunks under one key, e.g. as the attachments of a single message.
+
+    ``parts`` are (bytes, filename) pairs; the results line up with ``parts``.
+    """
+    return await _upload_backend(key).put_batch(parts, f"{len(parts)} chunks")
+
+async def get_storage_stats():
+    """Get the kind and upload load of every storage shard."""
+    return {
+        "placement": settings.SHARD_PLACEMENT,
+        "upload_shards": upload_shards,
+        "write_back": settings.WRITE_BACK_ENABLED,
+        "shards": [backend.get_stats() for _, backend in sorted(backends.items())]
+    }
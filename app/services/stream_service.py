@@ -0,0 +1,144 @@
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional, Union
+
+from app.core.config import settings
+from app.exceptions import UploadBusyException
+
+class BufferPool:
+    """Reusable chunk-sized buffers shared by every streaming upload.
+
+    At most ``max_buffers`` exist at once; when all are in use, readers
+    wait for one to be released, which caps upload memory process-wide
+    and pushes back on clients while Discord catches up.
+    """
+
+    def __init__(self, buffer_size: int, max_buffers: int):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free: List[bytearray] = []
+        self._created = 0
+        self._available = asyncio.Condition()
+
+    async def acquire(self, timeout: Optional[float] = None) -> bytearray:
+        """Take a buffer, raising UploadBusyException if none frees up within ``timeout`` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self._available:
+            while not self._free and self._created >= self.max_buffers:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                try:
+                    if remaining is not None and remaining <= 0:
+                        raise asyncio.TimeoutError
+                    await asyncio.wait_for(self._available.wait(), remaining)
+                except asyncio.TimeoutError:
+                    if self._free:
+                        # A release may have woken us just as we timed out; pass it on
+                        self._available.notify()
+                    raise UploadBusyException()
+            if self._free:
+                return self._free.pop()
+            self._created += 1
+        return bytearray(self.buffer_size)
+
+    async def release(self, buffer: bytearray):
+        async with self._available:
+            self._free.append(buffer)
+            self._available.notify()
+
+    def stats(self):
+        return {
+            "buffer_size": self.buffer_size,
+            "max_buffers": self.max_buffers,
+            "created": self._created,
+            "free": len(self._free)
+        }
+
+# Shared pool for streaming uploads
+upload_buffer_pool = BufferPool(settings.CHUNK_SIZE, settings.UPLOAD_BUFFER_POOL_SIZE)
+
+class RequestBodyReader:
+    """Reads a request body in chunk-sized blocks straight into pooled buffers.
+
+    read() returns a memoryview over a pooled buffer; hand it back with
+    release() once the chunk has been sent. Data is copied once, from the
+    network into the buffer, without spooling to disk.
+
+    A buffer is only taken once the client has sent data for it, a reader
+    holds at most ``max_buffers`` at a time, and waiting longer than
+    UPLOAD_BUFFER_TIMEOUT for one raises UploadBusyException, so a few slow
+    clients cannot stall every other upload.
+    """
+
+    def __init__(
+        self,
+        stream: AsyncIterator[bytes],
+        pool: BufferPool = upload_buffer_pool,
+        max_buffers: int = settings.UPLOAD_BUFFERS_PER_REQUEST
+    ):
+        self.stream = stream
+        self.pool = pool
+        self.pending = memoryview(b"")
+        self.finished = False
+        self.held = asyncio.Semaphore(max(1, max_buffers))
+
+    async def _next_piece(self) -> Optional[memoryview]:
+        if self.finished:
+            return None
+        try:
+            piece = await self.stream.__anext__()
+        except StopAsyncIteration:
+            self.finished = True
+            return None
+        return memoryview(piece)
+
+    async def read(self, size: int) -> Union[memoryview, bytes]:
+        size = min(size, self.pool.buffer_size)
+        if await self.at_end():
+            return b""
+        await self.held.acquire()
+        try:
+            buffer = await self.pool.acquire(settings.UPLOAD_BUFFER_TIMEOUT)
+        except BaseException:
+            self.held.release()
+            raise
+        try:
+            filled = 0
+            while filled < size:
+                if not self.pending:
+                    piece = await self._next_piece()
+                    if piece is None:
+                        break
+                    self.pending = piece
+                take = min(len(self.pending), size - filled)
+                buffer[filled:filled + take] = self.pending[:take]
+                self.pending = self.pending[take:]
+                filled += take
+        except BaseException:
+            await self._release_buffer(buffer)
+            raise
+        if not filled:
+            await self._release_buffer(buffer)
+            return b""
+        return memoryview(buffer)[:filled]
+
+    async def _release_buffer(self, buffer: bytearray):
+        await self.pool.release(buffer)
+        self.held.release()
+
+    async def at_end(self) -> bool:
+        """Whether the body has been read completely."""
+        while not self.pending:
+            piece = await self._next_piece()
+            if piece is None:
+                return True
+            self.pending = piece
+        return False
+
+    async def release(self, chunk):
+        """Return the buffer behind a chunk from read() to the pool."""
+        if isinstance(chunk, memoryview) and isinstance(chunk.obj, bytearray):
+            await self._release_buffer(chunk.obj)
+
+async def get_upload_buffer_stats():
+    """Get usage of the streaming upload buffer pool."""
+    return upload_buffer_pool.stats()
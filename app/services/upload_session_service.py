@@ -0,0 +1,205 @@
+import asyncio
+import secrets
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import text, select
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.exceptions import NotFoundException, ValidationException
+from app.logger import logger
+from app.models import File, FileChunk, UploadSession
+from app.services.storage_service import upload_file_chunk
+from app.services.dedup_service import (
+    reference_chunk_blob, release_chunks, filter_unreferenced_messages, drop_packs
+)
+from app.services.delete_service import enqueue_deletions
+from app.services.file_service import prepare_chunk, discard_uploaded_chunks, add_file, get_mime_type
+from app.services.naming_service import get_violated_constraint
+
+# Unique index that makes each chunk of a session commit once; see models.py
+SESSION_CHUNK_CONSTRAINT = "ix_file_chunks_upload_session_id_chunk_id"
+
+def get_chunk_count(size: int, chunk_size: int) -> int:
+    return (size + chunk_size - 1) // chunk_size
+
+def get_chunk_length(session: UploadSession, chunk_id: int) -> int:
+    """Exact number of bytes expected for a chunk of the session."""
+    start = (chunk_id - 1) * session.chunk_size
+    return min(session.chunk_size, session.size - start)
+
+def get_committed_ranges(session: UploadSession, chunk_ids: List[int]) -> List[Tuple[int, int]]:
+    """Merge committed chunks into inclusive byte ranges."""
+    ranges = []
+    for chunk_id in sorted(chunk_ids):
+        start = (chunk_id - 1) * session.chunk_size
+        end = start + get_chunk_length(session, chunk_id) - 1
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+async def create_upload_session(db: AsyncSession, user_id: int, folder_id: int, file_name: str, size: int) -> UploadSession:
+    """Open a resumable upload of ``size`` bytes into a folder."""
+    if size < 0:
+        raise ValidationException("Upload size cannot be negative")
+    session = UploadSession(
+        id=secrets.token_hex(16),
+        user_id=user_id,
+        folder_id=folder_id,
+        file_name=file_name,
+        size=size,
+        chunk_size=settings.CHUNK_SIZE,
+        created_at=datetime.now(timezone.utc),
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    )
+    db.add(session)
+    await db.commit()
+    return session
+
+async def get_upload_session(db: AsyncSession, session_id: str, user_id: int) -> UploadSession:
+    """Get an open upload session belonging to the user."""
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.id == session_id, UploadSession.user_id == user_id)
+    )
+    session = result.scalar_one_or_none()
+    if not session or session.expires_at <= datetime.now(timezone.utc):
+        raise NotFoundException(f"Upload session {session_id} not found or expired")
+    return session
+
+async def get_committed_chunks(db: AsyncSession, session_id: str) -> List[int]:
+    result = await db.execute(
+        text("SELECT chunk_id FROM file_chunks WHERE upload_session_id = :session_id ORDER BY chunk_id"),
+        {"session_id": session_id}
+    )
+    return [row.chunk_id for row in result.fetchall()]
+
+async def get_upload_session_status(db: AsyncSession, session: UploadSession) -> Dict[str, Any]:
+    """Describe which parts of a session are already stored."""
+    committed = await get_committed_chunks(db, session.id)
+    chunk_count = get_chunk_count(session.size, session.chunk_size)
+    committed_set = set(committed)
+    return {
+        "id": session.id,
+        "file_name": session.file_name,
+        "folder_id": session.folder_id,
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "chunk_count": chunk_count,
+        "committed_chunks": committed,
+        "missing_chunks": [chunk_id for chunk_id in range(1, chunk_count + 1) if chunk_id not in committed_set],
+        "committed_ranges": [{"start": start, "end": end} for start, end in get_committed_ranges(session, committed)],
+        "expires_at": session.expires_at
+    }
+
+async def is_chunk_committed(db: AsyncSession, session_id: str, chunk_id: int) -> bool:
+    result = await db.execute(
+        text("SELECT 1 FROM file_chunks WHERE upload_session_id = :session_id AND chunk_id = :chunk_id"),
+        {"session_id": session_id, "chunk_id": chunk_id}
+    )
+    return result.fetchone() is not None
+
+def validate_chunk_id(session: UploadSession, chunk_id: int):
+    chunk_count = get_chunk_count(session.size, session.chunk_size)
+    if not 1 <= chunk_id <= chunk_count:
+        raise ValidationException(f"Chunk {chunk_id} is outside 1..{chunk_count}")
+
+async def store_session_chunk(session: UploadSession, chunk_id: int, data) -> bool:
+    """Upload one chunk of a session and commit it immediately.
+
+    The chunk takes its blob reference at once, so it survives a dropped
+    connection and is never re-sent. Returns False when a parallel request
+    committed the same chunk first; our copy is then discarded. Any other
+    integrity error, e.g. the folder being deleted meanwhile, is raised.
+    """
+    validate_chunk_id(session, chunk_id)
+    expected = get_chunk_length(session, chunk_id)
+    if len(data) != expected:
+        raise ValidationException(f"Chunk {chunk_id} must be exactly {expected} bytes, got {len(data)}")
+
+    columns, payload = await prepare_chunk(data, get_mime_type(session.file_name))
+    if payload is not None:
+        columns.update(await upload_file_chunk(payload, session.file_name, chunk_id, columns["content_hash"]))
+    uploaded = {chunk_id: dict(columns)}
+
+    try:
+        async with AsyncSessionLocal() as db:
+            reused = columns.pop("reused", False)
+            columns, reused, orphaned = await reference_chunk_blob(db, columns, reused)
+            db.add(FileChunk(
+                upload_session_id=session.id,
+                folder_id=session.folder_id,
+                chunk_id=chunk_id,
+                **columns
+            ))
+            await db.flush()
+            # Our copy may have lost a race with another upload of the same content
+            messages = await filter_unreferenced_messages(db, orphaned)
+            await drop_packs(db, messages)
+            await enqueue_deletions(db, messages)
+            await db.commit()
+        return True
+    except IntegrityError as e:
+        await discard_uploaded_chunks(uploaded)
+        if get_violated_constraint(e) != SESSION_CHUNK_CONSTRAINT:
+            raise
+        return False
+    except BaseException:
+        await discard_uploaded_chunks(uploaded)
+        raise
+
+async def finalize_upload_session(db: AsyncSession, session: UploadSession) -> File:
+    """Turn a fully uploaded session into a file in one transaction."""
+    # Serialises concurrent finalize calls for the same session
+    result = await db.execute(
+        text("SELECT id FROM upload_sessions WHERE id = :id FOR UPDATE"),
+        {"id": session.id}
+    )
+    if not result.fetchone():
+        raise NotFoundException(f"Upload session {session.id} not found or expired")
+    committed = await get_committed_chunks(db, session.id)
+    chunk_count = get_chunk_count(session.size, session.chunk_size)
+    if len(committed) != chunk_count:
+        raise ValidationException(f"Upload incomplete: {len(committed)} of {chunk_count} chunks committed")
+
+    file = await add_file(db, session.file_name, session.folder_id, session.size, chunk_count)
+    # The chunks already hold their blob references; they only change owner
+    await db.execute(
+        text("""
+            UPDATE file_chunks SET file_id = :file_id, file_name = :file_name, upload_session_id = NULL
+            WHERE upload_session_id = :session_id
+        """),
+        {"file_id": file.id, "file_name": file.name, "session_id": session.id}
+    )
+    await db.execute(text("DELETE FROM upload_sessions WHERE id = :id"), {"id": session.id})
+    await db.commit()
+    return file
+
+async def abort_upload_session(db: AsyncSession, session_id: str):
+    """Drop a session and release the chunks it already stored, in the caller's transaction."""
+    await release_chunks(db, "upload_session_id = :session_id", {"session_id": session_id})
+    await db.execute(text("DELETE FROM upload_sessions WHERE id = :id"), {"id": session_id})
+
+async def expire_upload_sessions() -> int:
+    """Abort sessions past their expiry. Returns how many were removed."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text("SELECT id FROM upload_sessions WHERE expires_at <= now()"))
+        session_ids = [row.id for row in result.fetchall()]
+        for session_id in session_ids:
+            await abort_upload_session(db, session_id)
+        await db.commit()
+    return len(session_ids)
+
+async def run_upload_session_reaper():
+    """Background loop aborting expired upload sessions."""
+    while True:
+        await asyncio.sleep(settings.UPLOAD_SESSION_REAP_INTERVAL)
+        try:
+            expired = await expire_upload_sessions()
+            if expired:
+                logger.info(f"Aborted {expired} expired upload sessions")
+        except Exception as e:
+            logger.error(f"Error expiring upload sessions: {str(e)}")
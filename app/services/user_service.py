@@ -1,6 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async, invalidate_user
 from app.schemas import UserCreate
 
 async def get_user_by_email(db: AsyncSession, email: str):
@@ -17,7 +17,7 @@ async def get_user_by_username(db: AsyncSession, username: str):
 
 async def create_user(db: AsyncSession, user_data: UserCreate):
     """Create a new user."""
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     query = text("""
         INSERT INTO users (email, username, hashed_password, is_active)
@@ -45,6 +45,29 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
-    return user
\ No newline at end of file
+    return user
+
+async def set_user_active(db: AsyncSession, username: str, is_active: bool):
+    """Activate or deactivate a user; cached tokens are dropped so it applies at once."""
+    result = await db.execute(
+        text("UPDATE users SET is_active = :is_active WHERE username = :username RETURNING id"),
+        {"is_active": is_active, "username": username}
+    )
+    updated = result.fetchone()
+    await db.commit()
+    invalidate_user(username)
+    return updated is not None
+
+async def change_password(db: AsyncSession, username: str, new_password: str):
+    """Set a new password for a user and drop the user's cached tokens."""
+    hashed_password = await get_password_hash_async(new_password)
+    result = await db.execute(
+        text("UPDATE users SET hashed_password = :hashed_password WHERE username = :username RETURNING id"),
+        {"hashed_password": hashed_password, "username": username}
+    )
+    updated = result.fetchone()
+    await db.commit()
+    invalidate_user(username)
+    return updated is not None
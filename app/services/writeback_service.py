@@ -0,0 +1,272 @@
+import asyncio
+import time
+from sqlalchemy import text, bindparam
+from typing import Dict, List, Set, Tuple
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.logger import logger
+from app.services.storage_service import STAGING_SHARD, staging, pick_shard
+from app.services.delete_service import enqueue_deletions, schedule_deletions
+from app.services.dedup_service import filter_unreferenced_messages
+
+# Staged key -> (failed attempts, monotonic time of the next attempt)
+_failures: Dict[str, Tuple[int, float]] = {}
+
+# Location columns rewritten when a staged part moves to its shard
+_MOVE_COLUMNS = "discord_message_id = :discord_message_id, shard = :shard, attachment_url = :attachment_url, url_expires_at = :url_expires_at"
+
+def get_retry_delay(attempts: int) -> float:
+    """Exponential backoff in seconds for a flush that has failed ``attempts`` times."""
+    return min(settings.WRITE_BACK_RETRY_BASE * 2 ** min(attempts, 16), settings.WRITE_BACK_RETRY_MAX)
+
+async def list_pending_keys(limit: int) -> List[str]:
+    """Staged keys referenced by committed rows, skipping those backing off after a failure.
+
+    ``shard < 0`` matches the partial indexes on staged rows; staging is the
+    only negative shard.
+    """
+    now = time.monotonic()
+    waiting = [key for key, (_, next_attempt) in _failures.items() if next_attempt > now]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("""
+                SELECT discord_message_id FROM chunk_blobs WHERE shard < 0
+                UNION
+                SELECT discord_message_id FROM file_chunks WHERE shard < 0
+                UNION
+                SELECT discord_message_id FROM packs WHERE shard < 0
+                LIMIT :limit
+            """),
+            {"limit": limit + len(waiting)}
+        )
+        keys = [row.discord_message_id for row in result.fetchall()]
+    return [key for key in keys if key not in waiting][:limit]
+
+async def _staged_parts(db, key: str) -> List[int]:
+    result = await db.execute(
+        text("""
+            SELECT COALESCE(attachment_index, 0) AS attachment_index FROM chunk_blobs
+            WHERE discord_message_id = :key AND shard = :shard
+            UNION
+            SELECT COALESCE(attachment_index, 0) FROM file_chunks
+            WHERE discord_message_id = :key AND shard = :shard
+            UNION
+            SELECT 0 FROM packs WHERE discord_message_id = :key AND shard = :shard
+        """),
+        {"key": key, "shard": STAGING_SHARD}
+    )
+    return sorted(row.attachment_index for row in result.fetchall())
+
+async def flush_staged_object(key: str) -> bool:
+    """Copy one staged object to a storage shard and repoint every row using it.
+
+    Only the parts still referenced are copied, as one new object, so a
+    batch whose files were partly deleted shrinks on the way out. Rows are
+    repointed and the staged copy is queued for deletion in one
+    transaction; until it commits, readers keep using the staged copy.
+    Returns False if nothing referenced the key any more.
+    """
+    async with AsyncSessionLocal() as db:
+        indexes = await _staged_parts(db, key)
+    if not indexes:
+        return False
+
+    parts = [(await staging.get(key, index), f"staged-{key}.{index}.bin") for index in indexes]
+    stored = await pick_shard().put_batch(parts, f"{len(parts)} staged chunks")
+    copy = [(stored[0]["discord_message_id"], stored[0]["shard"])]
+
+    async with AsyncSessionLocal() as db:
+        try:
+            moved = 0
+            # chunk_blobs first: uploads referencing the blob wait on its row
+            # lock and then see the new location
+            for table in ("chunk_blobs", "packs", "file_chunks"):
+                for index, location in zip(indexes, stored):
+                    if table == "packs":
+                        if index:
+                            continue
+                        statement = f"UPDATE packs SET {_MOVE_COLUMNS} WHERE discord_message_id = :key AND shard = :staging"
+                    else:
+                        statement = f"""
+                            UPDATE {table} SET {_MOVE_COLUMNS}, attachment_index = :attachment_index
+                            WHERE discord_message_id = :key AND shard = :staging
+                              AND COALESCE(attachment_index, 0) = :index
+                        """
+                    result = await db.execute(
+                        text(statement), {**location, "key": key, "staging": STAGING_SHARD, "index": index}
+                    )
+                    moved += result.rowcount
+            if not moved:
+                # Another flusher got there first or the files were deleted meanwhile
+                await db.rollback()
+                await schedule_deletions(copy)
+                return False
+            messages = await filter_unreferenced_messages(db, [(key, STAGING_SHARD)])
+            await enqueue_deletions(db, messages)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await schedule_deletions(copy)
+            raise
+    return True
+
+async def flush_staging() -> int:
+    """Flush one batch of pending staged objects. Returns how many were flushed."""
+    keys = await list_pending_keys(settings.WRITE_BACK_BATCH_SIZE)
+    if not keys:
+        return 0
+    window = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+
+    async def flush(key: str) -> bool:
+        async with window:
+            try:
+                flushed = await flush_staged_object(key)
+                _failures.pop(key, None)
+                return flushed
+            except Exception as e:
+                attempts = _failures.get(key, (0, 0))[0]
+                _failures[key] = (attempts + 1, time.monotonic() + get_retry_delay(attempts))
+                logger.warning(f"Flushing staged object {key} failed (attempt {attempts + 1}): {str(e)}")
+                return False
+
+    results = await asyncio.gather(*(flush(key) for key in keys))
+    return sum(results)
+
+async def _referenced_keys(db, keys: List[str]) -> Set[str]:
+    """Staged keys that committed rows or the delete outbox refer to."""
+    result = await db.execute(
+        text("""
+            SELECT discord_message_id FROM chunk_blobs WHERE discord_message_id IN :keys
+            UNION
+            SELECT discord_message_id FROM file_chunks WHERE discord_message_id IN :keys
+            UNION
+            SELECT discord_message_id FROM packs WHERE discord_message_id IN :keys
+            UNION
+            SELECT discord_message_id FROM delete_outbox WHERE discord_message_id IN :keys
+        """).bindparams(bindparam("keys", expanding=True)),
+        {"keys": keys}
+    )
+    return {row.discord_message_id for row in result.fetchall()}
+
+async def renew_staging_leases() -> int:
+    """Extend the leases of objects this worker staged that nothing refers to yet.
+
+    Once rows or the delete outbox refer to an object its lease is dropped:
+    from then on those rows keep it. Returns the number of leases renewed.
+    """
+    keys = list(staging.leased)
+    if not keys:
+        return 0
+    async with AsyncSessionLocal() as db:
+        referenced = await _referenced_keys(db, keys)
+        pending = [key for key in keys if key not in referenced]
+        if referenced:
+            await db.execute(
+                text("DELETE FROM staging_leases WHERE discord_message_id IN :keys")
+                .bindparams(bindparam("keys", expanding=True)),
+                {"keys": list(referenced)}
+            )
+        if pending:
+            await db.execute(
+                text("""
+                    UPDATE staging_leases SET expires_at = now() + make_interval(secs => :ttl)
+                    WHERE discord_message_id IN :keys
+                """).bindparams(bindparam("keys", expanding=True)),
+                {"keys": pending, "ttl": settings.STAGING_LEASE_TTL}
+            )
+        await db.commit()
+    staging.leased.difference_update(referenced)
+    return len(pending)
+
+async def recover_staging() -> int:
+    """Remove staged objects left behind by uploads that never committed.
+
+    Committed pending chunks need no recovery: their rows still point at
+    staging, so the flusher simply picks them up again. Objects with a live
+    lease are kept, as their upload is still running in some worker; a
+    lease only expires once the worker that took it stopped renewing it.
+    Objects younger than STAGING_ORPHAN_AGE are kept too. Expired leases
+    are dropped. Returns the number of objects removed.
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("DELETE FROM staging_leases WHERE expires_at <= now()"))
+        await db.commit()
+    keys = await staging.list_keys(settings.STAGING_ORPHAN_AGE)
+    if not keys:
+        return 0
+    async with AsyncSessionLocal() as db:
+        referenced = await _referenced_keys(db, keys)
+        result = await db.execute(
+            text("""
+                SELECT discord_message_id FROM staging_leases
+                WHERE discord_message_id IN :keys AND expires_at > now()
+            """).bindparams(bindparam("keys", expanding=True)),
+            {"keys": keys}
+        )
+        leased = {row.discord_message_id for row in result.fetchall()}
+    orphaned = [key for key in keys if key not in referenced and key not in leased]
+    if orphaned:
+        await staging.delete(orphaned)
+    return len(orphaned)
+
+async def get_writeback_stats():
+    """Get the amount of staged data still waiting to be flushed."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            # The same parts list_pending_keys flushes; UNION counts a part
+            # shared by a blob and its chunks once, packed chunks via their pack
+            text("""
+                SELECT COUNT(DISTINCT discord_message_id) AS objects, COALESCE(SUM(stored_size), 0) AS bytes
+                FROM (
+                    SELECT discord_message_id, COALESCE(attachment_index, 0) AS attachment_index, stored_size
+                    FROM chunk_blobs WHERE shard < 0 AND pack_id IS NULL
+                    UNION
+                    SELECT discord_message_id, COALESCE(attachment_index, 0), stored_size
+                    FROM file_chunks WHERE shard < 0 AND pack_id IS NULL
+                    UNION
+                    SELECT discord_message_id, 0, size FROM packs WHERE shard < 0
+                ) AS staged
+            """)
+        )
+        pending = result.fetchone()
+    return {
+        "enabled": settings.WRITE_BACK_ENABLED,
+        "pending_objects": pending.objects,
+        "pending_bytes": pending.bytes,
+        "failing_objects": len(_failures)
+    }
+
+async def run_writeback_flusher():
+    """Background loop moving staged chunks to storage.
+
+    Pending chunks from before a crash or restart are found in the database
+    and flushed like any other. With WRITE_BACK_ENABLED off the loop only
+    drains what was staged before it was turned off, then exits.
+    """
+    try:
+        removed = await recover_staging()
+        if removed:
+            logger.info(f"Removed {removed} orphaned staged objects")
+    except Exception as e:
+        logger.error(f"Error recovering staging area: {str(e)}")
+    while True:
+        try:
+            flushed = await flush_staging()
+            if flushed:
+                logger.info(f"Flushed {flushed} staged objects to storage")
+                continue
+            if not settings.WRITE_BACK_ENABLED and not _failures:
+                return
+        except Exception as e:
+            logger.error(f"Error flushing staged chunks: {str(e)}")
+        await asyncio.sleep(settings.WRITE_BACK_INTERVAL)
+
+async def run_staging_lease_renewer():
+    """Background loop keeping the leases of this worker's in-flight staged objects alive."""
+    while True:
+        await asyncio.sleep(max(1, settings.STAGING_LEASE_TTL // 3))
+        try:
+            await renew_staging_leases()
+        except Exception as e:
+            logger.error(f"Error renewing staging leases: {str(e)}")
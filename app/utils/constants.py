@@ -19,6 +19,7 @@ FILE_DELETE_ERROR = "Error deleting file"
 FILE_CHUNK_ERROR = "Error processing file chunk"
 FILE_TYPE_NOT_SUPPORTED = "File type not supported for viewing in browser"
 FILE_TOO_LARGE = "File is too large to view in browser"
+UPLOAD_BUSY = "Server is busy with other uploads, retry later"
 
 # Discord Bot Error Messages
 DISCORD_BOT_ERROR = "Discord bot operation failed"
@@ -37,6 +38,8 @@ VALIDATION_ERROR = "Validation failed"
 EMPTY_FOLDER_NAME = "Folder name cannot be empty"
 INVALID_FILE_TYPE = "Invalid file type"
 INVALID_FILE_SIZE = "Invalid file size"
+INVALID_CURSOR = "Invalid or expired pagination cursor"
+INVALID_SORT = "Invalid sort field or order"
 
 # Response Messages
 SUCCESS_RESPONSE = {"status": True, "message": "Operation completed successfully"}
@@ -0,0 +1,70 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.exceptions import ValidationException
+from app.utils.constants import INVALID_CURSOR, INVALID_SORT
+
+SORT_ORDERS = ("asc", "desc")
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    """Opaque continuation token pointing just after the row (value, row_id)."""
+    payload = {"s": sort, "o": order, "id": row_id}
+    if isinstance(value, datetime):
+        payload["dt"] = value.isoformat()
+    else:
+        payload["v"] = value
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, sort: str, order: str) -> Tuple[Any, int]:
+    """Read back (value, row_id) from a token issued for the same sort and order."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        value = datetime.fromisoformat(payload["dt"]) if "dt" in payload else payload["v"]
+        row_id = int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise ValidationException(INVALID_CURSOR)
+    if payload.get("s") != sort or payload.get("o") != order:
+        # A token only makes sense for the ordering it was issued for
+        raise ValidationException(INVALID_CURSOR)
+    return value, row_id
+
+def keyset_query(
+    sorts: Dict[str, str],
+    sort: str,
+    order: str,
+    cursor: Optional[str]
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Build the WHERE fragment, ORDER BY clause and parameters of a keyset page.
+
+    ``sorts`` maps the public sort names to columns. Rows are ordered by
+    the column with the row id as tie-breaker, so pages are stable even
+    when many rows share a value.
+    """
+    if sort not in sorts or order not in SORT_ORDERS:
+        raise ValidationException(INVALID_SORT)
+    column = sorts[sort]
+    direction = order.upper()
+    order_by = f"ORDER BY {column} {direction}, id {direction}"
+    if not cursor:
+        return "", order_by, {}
+    value, row_id = decode_cursor(cursor, sort, order)
+    operator = ">" if order == "asc" else "<"
+    where = f"AND ({column}, id) {operator} (:cursor_value, :cursor_id)"
+    return where, order_by, {"cursor_value": value, "cursor_id": row_id}
+
+def paginate_rows(
+    rows: Sequence[Any],
+    limit: int,
+    sorts: Dict[str, str],
+    sort: str,
+    order: str
+) -> Tuple[List[Any], Optional[str]]:
+    """Split ``limit + 1`` fetched rows into the page and the next cursor, if any."""
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(sort, order, getattr(last, sorts[sort]), last.id)
@@ -0,0 +1,59 @@
+"""Compare two benchmark reports written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Rows are matched on (scenario, size, concurrency). Exits with status 1 when
+throughput drops or p95 latency rises by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Tuple
+
+from benchmarks.run import format_size
+
+def load_results(path: str) -> Dict[Tuple[str, int, int], Dict[str, Any]]:
+    with open(path) as report:
+        results = json.load(report)["results"]
+    return {(row["scenario"], row["size"], row["concurrency"]): row for row in results}
+
+def relative_change(old: float, new: float) -> float:
+    return (new - old) / old if old else 0.0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two JBox benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+    regressions = 0
+
+    header = f"{'scenario':<12}{'size':>8}{'conc':>6}{'req/s':>22}{'p95 ms':>24}"
+    print(header)
+    print("-" * len(header))
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        throughput = relative_change(old["throughput_rps"], new["throughput_rps"])
+        p95 = relative_change(old["p95_s"], new["p95_s"])
+        regressed = throughput < -args.threshold or p95 > args.threshold or new["errors"] > old["errors"]
+        regressions += regressed
+        scenario, size, concurrency = key
+        print(
+            f"{scenario:<12}{format_size(size) if size else '-':>8}{concurrency:>6}"
+            f"{old['throughput_rps']:>9.2f} -> {new['throughput_rps']:<7.2f}{throughput:>+6.0%}"
+            f"{old['p95_s'] * 1000:>9.1f} -> {new['p95_s'] * 1000:<7.1f}{p95:>+6.0%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        side = "baseline" if key in baseline else "candidate"
+        print(f"Only in {side}: {key[0]} {format_size(key[1]) if key[1] else '-'} x{key[2]}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""In-process stand-in for the Discord channels JBox stores chunks in.
+
+install() points every StorageBot at a FakeChannel sharing one
+FakeDiscord store, so the upload and download paths run unchanged down to
+the discord.py calls. Each call sleeps for a configurable round trip plus
+the time its payload takes at the configured bandwidth, and a fraction of
+calls can be answered with 429 to exercise the request scheduler.
+"""
+import asyncio
+import itertools
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import discord
+
+CDN_HOST = "cdn.fake-discord.local"
+URL_LIFETIME = timedelta(hours=24)
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.05  # Seconds per API or CDN round trip
+    bandwidth: float = 50 * 1024 * 1024  # Bytes per second per transfer, 0 for unlimited
+    rate_limit_ratio: float = 0.0  # Fraction of API calls answered with 429
+    retry_after: float = 0.5  # Retry-After sent with injected 429s
+    seed: Optional[int] = None
+
+@dataclass
+class FakeStats:
+    sends: int = 0
+    fetches: int = 0
+    cdn_reads: int = 0
+    deletes: int = 0
+    rate_limited: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+class FakeResponse:
+    """Just enough of an aiohttp response for discord.HTTPException."""
+
+    def __init__(self, status: int, reason: str, headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+@dataclass
+class FakeAttachment:
+    url: str
+    filename: str
+    size: int
+
+@dataclass
+class FakeMessage:
+    id: int
+    channel: "FakeChannel"
+    content: str
+    attachments: List[FakeAttachment] = field(default_factory=list)
+
+    async def delete(self):
+        await self.channel.discord.delete(self.channel, [self.id])
+
+class FakePartialMessage:
+    def __init__(self, channel: "FakeChannel", message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        await self.channel.discord.delete(self.channel, [self.id])
+
+class FakeDiscord:
+    """Messages and attachment bytes of every fake channel, keyed by id and URL."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.messages: Dict[int, FakeMessage] = {}
+        self.blobs: Dict[str, bytes] = {}
+        self.stats = FakeStats()
+        self._sequence = itertools.count()
+
+    def next_message_id(self) -> int:
+        # Real snowflakes, so message age checks such as bulk delete eligibility work
+        snowflake = discord.utils.time_snowflake(datetime.now(timezone.utc))
+        return snowflake + next(self._sequence) % (1 << 22)
+
+    async def round_trip(self, size: int = 0, api: bool = True):
+        """Sleep like a request carrying ``size`` bytes, raising 429 if one is injected."""
+        if api and self.config.rate_limit_ratio and self.random.random() < self.config.rate_limit_ratio:
+            self.stats.rate_limited += 1
+            await asyncio.sleep(self.config.latency)
+            headers = {"Retry-After": str(self.config.retry_after), "X-RateLimit-Reset-After": str(self.config.retry_after)}
+            raise discord.HTTPException(FakeResponse(429, "Too Many Requests", headers), "You are being rate limited.")
+        transfer = size / self.config.bandwidth if self.config.bandwidth else 0.0
+        await asyncio.sleep(self.config.latency + transfer)
+
+    def attachment_url(self, channel_id: int, message_id: int, index: int, filename: str) -> str:
+        expires = int((datetime.now(timezone.utc) + URL_LIFETIME).timestamp())
+        return f"https://{CDN_HOST}/attachments/{channel_id}/{message_id}/{index}/{filename}?ex={expires:x}"
+
+    async def send(self, channel: "FakeChannel", content: str, files: List[discord.File]) -> FakeMessage:
+        parts = [(file.filename, file.fp.read()) for file in files]
+        size = sum(len(data) for _, data in parts)
+        await self.round_trip(size)
+        message = FakeMessage(id=self.next_message_id(), channel=channel, content=content)
+        for index, (filename, data) in enumerate(parts):
+            url = self.attachment_url(channel.id, message.id, index, filename)
+            self.blobs[urlparse(url).path] = data
+            message.attachments.append(FakeAttachment(url=url, filename=filename, size=len(data)))
+        self.messages[message.id] = message
+        self.stats.sends += 1
+        self.stats.bytes_sent += size
+        return message
+
+    async def fetch(self, channel: "FakeChannel", message_id: int) -> FakeMessage:
+        await self.round_trip()
+        self.stats.fetches += 1
+        message = self.messages.get(int(message_id))
+        if message is None or message.channel is not channel:
+            raise discord.NotFound(FakeResponse(404, "Not Found"), "Unknown Message")
+        return message
+
+    async def read(self, url: str) -> bytes:
+        data = self.blobs.get(urlparse(url).path)
+        await self.round_trip(len(data or b""), api=False)
+        if data is None:
+            raise discord.NotFound(FakeResponse(404, "Not Found"), "Unknown attachment")
+        self.stats.cdn_reads += 1
+        self.stats.bytes_received += len(data)
+        return data
+
+    async def delete(self, channel: "FakeChannel", message_ids: List[int]):
+        await self.round_trip()
+        for message_id in message_ids:
+            message = self.messages.pop(int(message_id), None)
+            if message is None:
+                if len(message_ids) == 1:
+                    raise discord.NotFound(FakeResponse(404, "Not Found"), "Unknown Message")
+                continue
+            for attachment in message.attachments:
+                self.blobs.pop(urlparse(attachment.url).path, None)
+            self.stats.deletes += 1
+
+    async def refresh(self, urls: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        await self.round_trip()
+        refreshed = []
+        for url in urls:
+            path = urlparse(url).path
+            if path in self.blobs:
+                _, _, channel_id, message_id, index, filename = path.split("/")
+                fresh = self.attachment_url(int(channel_id), int(message_id), int(index), filename)
+                refreshed.append({"original": url, "refreshed": fresh})
+        return {"refreshed_urls": refreshed}
+
+class FakeChannel:
+    def __init__(self, fake: FakeDiscord, channel_id: int):
+        self.discord = fake
+        self.id = channel_id
+        self.name = f"fake-{channel_id}"
+
+    async def send(self, content: str = "", files: Optional[List[discord.File]] = None) -> FakeMessage:
+        return await self.discord.send(self, content, files or [])
+
+    async def fetch_message(self, message_id) -> FakeMessage:
+        return await self.discord.fetch(self, message_id)
+
+    def get_partial_message(self, message_id: int) -> FakePartialMessage:
+        return FakePartialMessage(self, message_id)
+
+    async def delete_messages(self, messages):
+        await self.discord.delete(self, [message.id for message in messages])
+
+class FakeHTTP:
+    """The two raw discord.py HTTP calls JBox makes: CDN reads and URL refreshes."""
+
+    def __init__(self, fake: FakeDiscord):
+        self.discord = fake
+
+    async def get_from_cdn(self, url: str) -> bytes:
+        return await self.discord.read(url)
+
+    async def request(self, route, json=None, **kwargs):
+        if route.path == "/attachments/refresh-urls":
+            return await self.discord.refresh(json["attachment_urls"])
+        raise NotImplementedError(f"Fake Discord does not implement {route.method} {route.path}")
+
+async def _channel_ready():
+    return None
+
+def install(config: FakeConfig) -> FakeDiscord:
+    """Point every storage shard at a fake channel and disable the real bot lifecycle.
+
+    Must run before the application starts up. Returns the shared store,
+    whose ``stats`` count the calls that reached the fake.
+    """
+    import app.main
+    from app.services import discord_service
+
+    fake = FakeDiscord(config)
+    for shard_bot in discord_service.bots:
+        shard_bot.channel = FakeChannel(fake, shard_bot.channel_id)
+        shard_bot.http = FakeHTTP(fake)
+        shard_bot.is_ready = lambda: True
+        shard_bot.ensure_channel = _channel_ready
+        shard_bot.ready.set()
+
+    async def start_bot():
+        return None
+
+    async def close_bot():
+        return None
+
+    # main.py binds these at import time
+    app.main.start_bot = start_bot
+    app.main.close_bot = close_bot
+    return fake